@@ -1207,7 +1207,9 @@ void print_usage(void)
   exit(0);
 }
 
-int main(int argc, char **argv)
+// the python extension calls this directly, since a symbol named main
+// would resolve to the interpreter's own main
+int kconfig_extractor_main(int argc, char **argv)
 {
   int opt;
   char *kconfig;
@@ -2119,3 +2121,8 @@ int main(int argc, char **argv)
 
   return 0;
 }
+
+int main(int argc, char **argv)
+{
+  return kconfig_extractor_main(argc, argv);
+}
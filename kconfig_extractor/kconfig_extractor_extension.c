@@ -1,41 +1,210 @@
 #include <Python.h>
 #include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <errno.h>
 #include <fcntl.h>
 #include <unistd.h>
+#include <sys/types.h>
+#include <sys/wait.h>
 
-int main(int, char **);
+int kconfig_extractor_main(int, char **);
 
 static PyObject *ExtractorError;
 
+/*
+ * The Kconfig parser keeps its state (symbol table, lexer, environment)
+ * in globals and exits on errors, so each extraction runs the tool in a
+ * forked child.  This leaves the calling process untouched, so it is
+ * safe to extract several ARCH/SRCARCH values in one process or from
+ * parallel worker processes.
+ */
+
+// run the extractor in a child process, with stdout redirected to
+// out_fd if it is not -1.  returns the child's pid or -1.
+static pid_t spawn_extractor(int out_fd, const char *outfile, const char *arch, const char *srcarch, const char *kconfig) {
+  pid_t pid;
+
+  fflush(stdout);
+  fflush(stderr);
+  pid = fork();
+  if (pid == 0) {
+    char arch_env[256];
+    char srcarch_env[256];
+    int argc = 0;
+    char *cargs[20];
+
+    snprintf(arch_env, sizeof(arch_env), "ARCH=%s", arch);
+    snprintf(srcarch_env, sizeof(srcarch_env), "SRCARCH=%s", srcarch);
+
+    if (out_fd != -1) {
+      if (dup2(out_fd, STDOUT_FILENO) == -1) {
+        _exit(1);
+      }
+      close(out_fd);
+    }
+
+    cargs[argc++] = "kconfig_extractor";
+    cargs[argc++] = "--extract";
+    if (NULL != outfile) {
+      cargs[argc++] = "-o";
+      cargs[argc++] = (char *) outfile;
+    }
+    cargs[argc++] = "-e";
+    cargs[argc++] = arch_env;
+    cargs[argc++] = "-e";
+    cargs[argc++] = srcarch_env;
+    cargs[argc++] = "-e";
+    cargs[argc++] = "KERNELVERSION=kcu";
+    cargs[argc++] = "-e";
+    cargs[argc++] = "srctree=./";
+    cargs[argc++] = "-e";
+    cargs[argc++] = "CC=cc";
+    cargs[argc++] = (char *) kconfig;
+    cargs[argc] = NULL;
+
+    int errcode = kconfig_extractor_main(argc, cargs);
+    fflush(stdout);
+    _exit(errcode);
+  }
+  return pid;
+}
+
+// wait for the child and return its exit code, or -1 if it did not
+// exit normally
+static int wait_extractor(pid_t pid) {
+  int status;
+
+  while (waitpid(pid, &status, 0) == -1) {
+    if (errno != EINTR) {
+      return -1;
+    }
+  }
+  if (WIFEXITED(status)) {
+    return WEXITSTATUS(status);
+  } else {
+    return -1;
+  }
+}
+
 static PyObject * extract_kconfig(PyObject *self, PyObject *args) {
   const char *outfile;
   const char *arch;
   const char *srcarch;
+  const char *kconfig = "Kconfig";
+  pid_t pid;
+  int errcode;
 
-  if (!PyArg_ParseTuple(args, "s|s|s", &outfile, &arch, &srcarch)) {
+  if (!PyArg_ParseTuple(args, "sss|s", &outfile, &arch, &srcarch, &kconfig)) {
     return NULL;
   }
 
-  const char *cargs[] = {
-    "kconfig_extractor", "--extract", "-o", outfile, "-e", arch, "-e", srcarch, "-e", "KERNELVERSION=kcu", "-e", "srctree=./", "-e", "CC=cc", "Kconfig"
-  };
-  
-  int errcode = main(15, cargs);
+  // the old interface passed "ARCH=..." and "SRCARCH=..." strings
+  if (strncmp(arch, "ARCH=", 5) == 0) arch += 5;
+  if (strncmp(srcarch, "SRCARCH=", 8) == 0) srcarch += 8;
+
+  Py_BEGIN_ALLOW_THREADS
+  pid = spawn_extractor(-1, outfile, arch, srcarch, kconfig);
+  errcode = pid == -1 ? -1 : wait_extractor(pid);
+  Py_END_ALLOW_THREADS
+
+  if (pid == -1) {
+    return PyErr_SetFromErrno(PyExc_OSError);
+  }
 
   return Py_BuildValue("i", errcode);
 }
 
+static PyObject * extract_kconfig_buffer(PyObject *self, PyObject *args) {
+  const char *arch;
+  const char *srcarch;
+  const char *kconfig = "Kconfig";
+  int fds[2];
+  pid_t pid;
+  char *buffer = NULL;
+  size_t size = 0;
+  size_t capacity = 0;
+  int read_error = 0;
+  int errcode;
+  PyObject *result;
+
+  if (!PyArg_ParseTuple(args, "ss|s", &arch, &srcarch, &kconfig)) {
+    return NULL;
+  }
+
+  if (pipe(fds) == -1) {
+    return PyErr_SetFromErrno(PyExc_OSError);
+  }
+
+  Py_BEGIN_ALLOW_THREADS
+  pid = spawn_extractor(fds[1], NULL, arch, srcarch, kconfig);
+  close(fds[1]);
+  if (pid != -1) {
+    // read the whole extract from the pipe
+    while (1) {
+      ssize_t n;
+
+      if (capacity - size < 65536) {
+        char *new_buffer;
+
+        capacity = capacity == 0 ? (1 << 20) : capacity * 2;
+        new_buffer = realloc(buffer, capacity);
+        if (NULL == new_buffer) {
+          read_error = ENOMEM;
+          break;
+        }
+        buffer = new_buffer;
+      }
+      n = read(fds[0], buffer + size, capacity - size);
+      if (n == 0) {
+        break;
+      } else if (n < 0) {
+        if (errno == EINTR) continue;
+        read_error = errno;
+        break;
+      }
+      size += n;
+    }
+  }
+  close(fds[0]);
+  errcode = pid == -1 ? -1 : wait_extractor(pid);
+  Py_END_ALLOW_THREADS
+
+  if (pid == -1) {
+    free(buffer);
+    return PyErr_SetFromErrno(PyExc_OSError);
+  }
+  if (read_error != 0) {
+    free(buffer);
+    errno = read_error;
+    return PyErr_SetFromErrno(PyExc_OSError);
+  }
+  if (errcode != 0) {
+    free(buffer);
+    PyErr_Format(ExtractorError, "kconfig_extractor failed for ARCH=%s SRCARCH=%s with exit code %d", arch, srcarch, errcode);
+    return NULL;
+  }
+
+  result = PyString_FromStringAndSize(buffer, size);
+  free(buffer);
+  return result;
+}
+
 static char extract_kconfig_docs[] =
-  "extract_kconfig( ): Extract Kconfig dependencies\n";
+  "extract_kconfig(outfile, arch, srcarch, kconfig=\"Kconfig\"): Extract Kconfig dependencies to outfile.  Returns the exit code.\n";
+
+static char extract_kconfig_buffer_docs[] =
+  "extract_kconfig_buffer(arch, srcarch, kconfig=\"Kconfig\"): Extract Kconfig dependencies and return them as a string.  Raises kconfig_extractor.error on failure.\n";
 
 static PyMethodDef kconfig_extractor_funcs[] = {
   {"extract_kconfig", (PyCFunction)extract_kconfig, METH_VARARGS, extract_kconfig_docs},
+  {"extract_kconfig_buffer", (PyCFunction)extract_kconfig_buffer, METH_VARARGS, extract_kconfig_buffer_docs},
   {NULL}
 };
 
 void initkconfig_extractor(void) {
   PyObject *m;
-  
+
   m = Py_InitModule3("kconfig_extractor", kconfig_extractor_funcs,
                  "Extract Kconfig dependencies.");
   ExtractorError = PyErr_NewException("kconfig_extractor.error", NULL, NULL);
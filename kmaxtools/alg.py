@@ -4,8 +4,10 @@ import re
 import argparse
 import subprocess as sp
 import tempfile
+import multiprocessing
+import time
 
-from pymake import parser, parserdata, data, functions
+from pymake import parser, parserdata, data, functions, util
 from collections import defaultdict
 
 import pdb
@@ -16,6 +18,8 @@ import kmaxtools.vcommon as CM
 from datastructures import CondDef, Multiverse, VarEntry, BoolVar, Results
 
 import kmaxtools.settings
+from kmaxtools import parse_cache
+from kmaxtools import source_index
 mlog = CM.getLogger(__name__, kmaxtools.settings.logger_level)
 
 match_unexpanded_variables = re.compile(r'.*\$\(.*\).*')
@@ -37,6 +41,7 @@ def bdd_ithvar(i): return kmaxtools.datastructures.bdd_ithvar(i)
 def bdd_init(): kmaxtools.datastructures.bdd_init()
 def bdd_destroy(): kmaxtools.datastructures.bdd_destroy()
 def isbddfalse(b): return kmaxtools.datastructures.isbddfalse(b)
+def bdd_size(b): return kmaxtools.datastructures.bdd_size(b)
 
 def zconj(a, b): return None if a is None or b is None else z3.simplify(z3.And(a, b))
 def zdisj(a, b): return None if a is None or b is None else z3.simplify(z3.Or(a, b))
@@ -79,6 +84,196 @@ class ZSolver:
         self.solver.pop()
         return ret
 
+def parse_value(val):
+    d = parser.Data.fromstring(val, None)
+    e, t, o = parser.parsemakesyntax(d, 0, (), parser.iterdata)
+    if t != None or o != None:
+        # TODO: do something if part of the string is left over
+        pass
+    return e
+
+# the same definitions are expanded many times, and the parsed
+# expansions are only read, so they are shared
+parsed_values = util.LRUCache(16 << 20, parse_value, sizefunc=lambda val, e: 8 * len(val))
+
+# relevance slicing.  Run.extract only reads the variables that list
+# units and subdirectories, the variables of composites, and whatever
+# variables those read, so assignments to anything else, e.g.,
+# ccflags-y or CFLAGS_foo.o, can be skipped before symbolic evaluation.
+# the slice is the fixed point of the assignments that may set a read
+# variable.  it is conservative: an assignment whose name is computed is
+# kept unless the literal prefix of its name rules it out, and slicing
+# is off for makefiles with includes or computed variable references,
+# whose reads cannot be known before evaluation.
+
+# the variables that Run.extract reads, by prefix or name
+result_prefixes = ("obj-", "lib-", "subdir-", "hostprogs-", "core-", "drivers-",
+                   "net-", "libs-", "head-", "always")
+result_names = set([ "host-progs", "SPECIAL-obj-simple", "SPECIAL-core-simple" ])
+
+# the functions that Kbuild.process_function evaluates.  the others
+# are kept as text, so they read no variables
+evaluated_functions = (functions.VariableRef, functions.SubstitutionRef,
+                       functions.SubstFunction, functions.IfFunction,
+                       functions.FilteroutFunction, functions.PatSubstFunction,
+                       functions.SortFunction, functions.AddPrefixFunction)
+
+# list-valued variables, whose values are only ever split into tokens,
+# are expanded token by token.  see Kbuild.expand_tokens
+list_suffixes = ("-y", "-m", "-objs")
+
+def is_list_variable(name):
+    return name in result_names or name.startswith(result_prefixes) or name.endswith(list_suffixes)
+
+class CannotSlice(Exception):
+    pass
+
+def get_references(expansion, refs):
+    """add the names of the variables an expansion reads to refs"""
+    if isinstance(expansion, data.StringExpansion):
+        return
+    for element, isfunc in expansion:
+        if not isfunc or not isinstance(element, evaluated_functions):
+            continue
+        if isinstance(element, (functions.VariableRef, functions.SubstitutionRef)):
+            if not isinstance(element.vname, data.StringExpansion):
+                raise CannotSlice("computed variable name {}".format(element.vname.to_source()))
+            refs.add(element.vname.s)
+            if isinstance(element, functions.SubstitutionRef):
+                get_references(element.substfrom, refs)
+                get_references(element.substto, refs)
+        else:
+            for argument in element._arguments:
+                get_references(argument, refs)
+
+def get_literal_words(expansion, words, prefixes):
+    """add the whitespace-delimited words of an expansion's literal text
+    to words.  for words with a function call in them, add the literal
+    text before the call to prefixes, and the literal words of the
+    function's arguments to words.  words starting with a variable
+    reference are left out, since the variable's own assignments have
+    their words."""
+    if isinstance(expansion, data.StringExpansion):
+        words.update(expansion.s.split())
+        return
+    for i, (element, isfunc) in enumerate(expansion):
+        if not isfunc:
+            # a word that continues into a following function is a prefix
+            text_words = element.split()
+            if i + 1 < len(expansion) and len(text_words) > 0 and not element[-1].isspace():
+                prefixes.add(text_words.pop())
+            # a word continuing from a preceding function is not literal
+            if i > 0 and len(text_words) > 0 and not element[0].isspace():
+                text_words.pop(0)
+            words.update(text_words)
+        elif not isinstance(element, functions.VariableRef):
+            for argument in element._arguments:
+                get_literal_words(argument, words, prefixes)
+
+def get_name_prefix(expansion):
+    """get the literal text before the first function call in a name"""
+    if isinstance(expansion, data.StringExpansion):
+        return expansion.s
+    element, isfunc = expansion[0]
+    return "" if isfunc else element
+
+def get_condition_references(block):
+    refs = set()
+    for cond, stmts in block:
+        if isinstance(cond, parserdata.IfdefCondition):
+            get_references(cond.exp, refs)
+            if isinstance(cond.exp, data.StringExpansion):
+                refs.add(cond.exp.s)
+        elif isinstance(cond, parserdata.EqCondition):
+            get_references(cond.exp1, refs)
+            get_references(cond.exp2, refs)
+    return refs
+
+def get_assignments(stmts, blocks, assignments):
+    """collect the assignments with the condition blocks around them"""
+    for s in stmts:
+        if isinstance(s, parserdata.ConditionBlock):
+            for cond, block_stmts in s:
+                get_assignments(block_stmts, blocks + [s], assignments)
+        elif isinstance(s, parserdata.SetVariable):
+            assignments.append((s, blocks))
+        elif isinstance(s, parserdata.Include):
+            raise CannotSlice("include")
+
+def get_skipped_stmts(stmts):
+    """
+    get the ids of the assignments outside of the slice, and of the
+    condition blocks with nothing but those in them, or an empty set if
+    the makefile cannot be sliced
+    """
+    try:
+        assignments = []
+        get_assignments(stmts, [], assignments)
+        entries = []
+        for s, blocks in assignments:
+            refs = set()
+            get_references(s.vnameexp, refs)
+            get_references(parsed_values.get(s.value), refs)
+            words = set()
+            prefixes = set()
+            get_literal_words(parsed_values.get(s.value), words, prefixes)
+            name = s.vnameexp.s if isinstance(s.vnameexp, data.StringExpansion) else None
+            entries.append((s, blocks, name, get_name_prefix(s.vnameexp), refs, words, prefixes))
+        block_refs = {}
+        for s, blocks in assignments:
+            for block in blocks:
+                if id(block) not in block_refs:
+                    block_refs[id(block)] = get_condition_references(block)
+    except CannotSlice as e:
+        mlog.info("not slicing: {}".format(e))
+        return set()
+
+    # the names that are read, and the prefixes of names that may be
+    read_names = set(result_names)
+    read_prefixes = set(result_prefixes)
+    kept = set()
+    changed = True
+    while changed:
+        changed = False
+        for s, blocks, name, name_prefix, refs, words, prefixes in entries:
+            if id(s) in kept:
+                continue
+            if name is not None:
+                relevant = name in read_names or name.startswith(tuple(read_prefixes))
+            else:
+                relevant = name_prefix == "" or \
+                    any(prefix.startswith(name_prefix) or name_prefix.startswith(prefix) for prefix in read_prefixes) or \
+                    any(read_name.startswith(name_prefix) for read_name in read_names)
+            if not relevant:
+                continue
+            kept.add(id(s))
+            changed = True
+            read_names.update(refs)
+            for block in blocks:
+                read_names.update(block_refs[id(block)])
+            # any word may name a composite, whose variables are, e.g.,
+            # foo-objs, foo-y, or foo-$(CONFIG_A) for foo.o
+            for word in words:
+                read_prefixes.add((word[:-2] if word.endswith(".o") else word) + "-")
+            read_prefixes.update(prefixes)
+
+    skipped = set()
+    def skip(stmts):
+        all_skipped = True
+        for s in stmts:
+            if isinstance(s, parserdata.ConditionBlock):
+                block_skipped = all([ skip(block_stmts) for cond, block_stmts in s ])
+                if block_skipped:
+                    skipped.add(id(s))
+                all_skipped = all_skipped and block_skipped
+            elif isinstance(s, parserdata.SetVariable) and id(s) not in kept:
+                skipped.add(id(s))
+            else:
+                all_skipped = False
+        return all_skipped
+    skip(stmts)
+    return skipped
+
 class Kbuild:
     def __init__(self):
         bdd_init()
@@ -98,11 +293,24 @@ class Kbuild:
         # self.composite_pc = {} # composite presence conditions
         # variable equivalence classes for optimized append
         self.var_equiv_sets = {}
+        # includes already parsed by a parse-ahead worker
+        self.parsed_includes = {}
+        # ids of statements outside of the relevance slice
+        self.skipped_stmts = set()
+        # widening, see widen and relax.  past the deadline, if any,
+        # every expansion with more than one value is widened
+        self.deadline = None
+        self.expanding_names = 0
+        self.widenings = 0
+        self.widened_blocks = 0
+        self.widened_variables = set()
 
     def process_stmts(self, stmts, cond, zcond):
         """Find configurations in the given list of stmts under the
         given presence cond."""
         for s in stmts:
+            if id(s) in self.skipped_stmts:
+                continue
             if isinstance(s, parserdata.ConditionBlock):
                 self.process_conditionblock(s, cond, zcond)
             elif isinstance(s, parserdata.SetVariable):
@@ -163,13 +371,17 @@ class Kbuild:
 
         return '\n'.join(ss)
     
-    def get_presence_conditions(self, vars, pcs, cond, zcond):
+    def get_presence_conditions(self, vars, pcs, cond, zcond, widened=None, is_widened=False):
+        """collect the presence conditions of the tokens in vars, and
+        those of composites, into pcs.  the tokens whose conditions were
+        over-approximated are added to widened"""
         names = set()
         for var in vars:
             if var in self.variables.keys():
                 names = names.union(self.get_var_equiv_set(var))
         while len(names) > 0:
             name = names.pop()
+            name_widened = is_widened or name in self.widened_variables
             # print name
             # print self.variables[name]
             for value, bdd_condition, z3_condition, flavor in self.variables[name]:
@@ -186,6 +398,8 @@ class Kbuild:
                         pcs[token] = and_zcond
                     else:
                         pcs[token] = zdisj(pcs[token], and_zcond)
+                    if name_widened and widened is not None:
+                        widened.add(token)
                     if token.endswith(".o"): # and unit_name not in compilation_units:
                         if (token[:-2] + "-objs") in self.variables or \
                             (token[:-2] + "-y") in self.variables:
@@ -195,7 +409,7 @@ class Kbuild:
                             # $(obj)/,,$(@:.o=-y)))), $^)
                             composite_variable1 = token[:-2] + "-objs"
                             composite_variable2 = token[:-2] + "-y"
-                            self.get_presence_conditions([ composite_variable1, composite_variable2 ], pcs, and_cond, and_zcond)
+                            self.get_presence_conditions([ composite_variable1, composite_variable2 ], pcs, and_cond, and_zcond, widened, name_widened)
 
     def add_definitions(self, defines):
         if not defines:
@@ -294,12 +508,15 @@ class Kbuild:
                 return Multiverse([v.condDef for v in self.variables[name]])
             
             else:
+                if name in self.widened_variables:
+                    # whatever uses an over-approximated value is too
+                    self.widenings += 1
                 expansions = []
                 equivs = self.get_var_equiv_set(name)
                 for equiv_name in equivs:
                     for v in self.variables[equiv_name]:
                         if v.val:
-                            expansions = expansions + self.expand_and_flatten(v.val, v.cond, v.zcond)
+                            expansions = expansions + self.expand_value(name, v.val, v.cond, v.zcond)
                         else:
                             expansions.append(v.condDef)
 
@@ -329,7 +546,7 @@ class Kbuild:
             return self.mk_Multiverse(function.to_source())
 
     def process_fun_VariableRef(self, function):
-        name = self.mk_Multiverse(self.process_expansion(function.vname))
+        name = self.mk_Multiverse(self.process_name(function.vname))
         expanded_names = []
         for name_cond, name_zcond, name_value  in name:
             expanded_name = self.process_variableref(name_value)
@@ -527,12 +744,14 @@ class Kbuild:
             ret = self.process_expansion(element)
             return ret
 
-    def hoist(self, expansion):
+    def hoist(self, expansion, widen=True):
         """Hoists a list of expansions, strings, and Multiverses.
-        return a Multiverse
+        return a Multiverse.  With widen, it is widened instead when
+        there are too many combinations.
         """
         #trace()
         hoisted = [(self.T, ZSolver.T, [])]
+        cap = self.get_multiverse_cap() if widen else None
         for element in expansion:
             if isinstance(element, Multiverse):
                 newlist = []
@@ -550,12 +769,16 @@ class Kbuild:
                                 newverse.append(subverse)
                             newlist.append((newcondition, newzcondition, newverse))
                 hoisted = newlist
+                if cap is not None and len(hoisted) > cap:
+                    return self.widen(expansion)
             else:
                 for condition, zcondition, verse in hoisted:
                     verse.append(element)
 
-        multiverse = Multiverse([CondDef(condition, zcondition, self.join_values(verse))
-                                 for condition, zcondition, verse in hoisted] )
+        multiverse = Multiverse()
+        for condition, zcondition, verse in hoisted:
+            condition, zcondition = self.relax(condition, zcondition)
+            multiverse.append(CondDef(condition, zcondition, self.join_values(verse)))
 
         multiverse = multiverse.dedup()
         return multiverse
@@ -594,6 +817,7 @@ class Kbuild:
         # Process first branch
         cond, stmts = block[0]  # condition is a Condition object
         first_branch_cond = None
+        widenings = self.widenings
         if isinstance(cond, parserdata.IfdefCondition):  # ifdef
             # TODO only care if condition.exp.variable_references contains
             # multiply-defined macros
@@ -666,18 +890,30 @@ class Kbuild:
 
         assert first_branch_zcond is not None, \
             "Could not get if branch cond {}".format(first_branch_zcond)
-        
-        # Enter first branch
-        # trace()
-        # print("process_conditionblock", z3.simplify(first_branch_zcond))
-        self.process_stmts(stmts, first_branch_cond, first_branch_zcond)
 
-        if not has_else:
-            return
+        widened = self.widenings > widenings
+        if widened:
+            # the condition was over-approximated, so either branch may
+            # be taken, and what they define is over-approximated too
+            first_branch_cond, first_branch_zcond = presence_cond, presence_zcond
+            else_branch_cond, else_branch_zcond = presence_cond, presence_zcond
+            self.widened_blocks += 1
 
-        # Process the else branch
-        cond, stmts = block[1]
-        self.process_stmts(stmts, else_branch_cond, else_branch_zcond)  # Enter else branch
+        try:
+            # Enter first branch
+            # trace()
+            # print("process_conditionblock", z3.simplify(first_branch_zcond))
+            self.process_stmts(stmts, first_branch_cond, first_branch_zcond)
+
+            if not has_else:
+                return
+
+            # Process the else branch
+            cond, stmts = block[1]
+            self.process_stmts(stmts, else_branch_cond, else_branch_zcond)  # Enter else branch
+        finally:
+            if widened:
+                self.widened_blocks -= 1
 
     def expand_and_flatten(self, val, cond, zcond):
         """Parse and expand a variable definition, flattening any
@@ -685,11 +921,7 @@ class Kbuild:
 
         @return a Multiverse list of (cond, val) pairs"""
         # Parse the variable's definition
-        d = parser.Data.fromstring(val, None)
-        e, t, o = parser.parsemakesyntax(d, 0, (), parser.iterdata)
-        if t != None or o != None:
-            # TODO: do something if part of the string is left over
-            pass
+        e = parsed_values.get(val)
 
         expanded = self.process_expansion(e)
         # print("expanded", expanded)
@@ -698,6 +930,148 @@ class Kbuild:
         else: # must be a multiverse
             return expanded
 
+    def expand_tokens(self, val, cond, zcond):
+        """Parse and expand the definition of a list variable, e.g.,
+        obj-y, returning a Multiverse with one (cond, token) pair per
+        token instead of one per combination of the values of the
+        variable expansions in it.  Each token's condition is the
+        disjunction of the conditions it appears under.  Only the
+        expansions within one word, e.g., foo-$(CONFIG_A).o, are
+        hoisted, so a definition with many independent expansions does
+        not grow combinatorially.
+
+        @return a Multiverse list of (cond, token) pairs"""
+        e = parsed_values.get(val)
+        if isinstance(e, data.StringExpansion):
+            elements = [ e.s ]
+        else:
+            elements = [ self.process_element(element, isfunc) for element, isfunc in e ]
+
+        expanded = []
+        for token_cond, token_zcond, token in self.hoist_tokens(elements):
+            and_cond = conj(cond, token_cond)
+            and_zcond = zconj(zcond, token_zcond)
+            if not isfalse(and_cond, and_zcond):
+                expanded.append(CondDef(and_cond, and_zcond, token))
+        if len(expanded) == 0:
+            # defined, but empty
+            expanded.append(CondDef(cond, zcond, ""))
+        return Multiverse(expanded)
+
+    def hoist_tokens(self, elements, widen=True):
+        """Hoist a list of strings and Multiverses like hoist, but only
+        within each word, i.e., the elements between whitespace, and
+        return one (cond, zcond, token) alternative per token"""
+        word_values = []
+        word = []
+        def add_word():
+            if len(word) == 0:
+                return
+            word_values.extend(self.hoist(word, widen))
+            del word[:]
+
+        for element in elements:
+            if isinstance(element, str):
+                if len(element) == 0:
+                    continue
+                if element[0].isspace():
+                    add_word()
+                element_words = element.split()
+                for i, element_word in enumerate(element_words):
+                    if i > 0:
+                        add_word()
+                    word.append(element_word)
+                if element[-1].isspace():
+                    add_word()
+            else:
+                word.append(element)
+        add_word()
+        return self.merge_tokens(word_values)
+
+    def merge_tokens(self, values):
+        """Merge a list of (cond, zcond, value) alternatives into one
+        (cond, zcond, token) alternative per token, in the order they
+        first appear, under the disjunction of the conditions of the
+        values it is in"""
+        tokens = []
+        token_conds = {}
+        for value_cond, value_zcond, value in values:
+            if value is None:
+                continue
+            for token in value.split():
+                if token not in token_conds:
+                    tokens.append(token)
+                    token_conds[token] = (value_cond, value_zcond)
+                else:
+                    token_cond, token_zcond = token_conds[token]
+                    token_conds[token] = (disj(token_cond, value_cond), zdisj(token_zcond, value_zcond))
+        return [ token_conds[token] + (token,) for token in tokens ]
+
+    def get_multiverse_cap(self):
+        """the most alternatives to hoist before widening, or None for
+        no limit"""
+        if self.expanding_names > 0:
+            return None
+        if self.deadline is not None and time.time() > self.deadline:
+            return 1
+        return kmaxtools.settings.max_multiverse
+
+    def process_name(self, expansion):
+        """Expand a variable name like process_expansion, but without
+        widening, since merged names would be other variables"""
+        self.expanding_names += 1
+        try:
+            return self.process_expansion(expansion)
+        finally:
+            self.expanding_names -= 1
+
+    def widen(self, expansion):
+        """Over-approximate the hoisting of a list of strings and
+        Multiverses with too many combinations by hoisting it token by
+        token.  This keeps each token's condition, but not which tokens
+        go together, e.g., ten independent appends to obj-y give ten
+        alternatives instead of 2^10 combinations.  Empty and undefined
+        alternatives are left out, since they would only be combined
+        into tokens that no configuration produces on its own, e.g.,
+        probe_.o from probe_$(BITS).o."""
+        self.widenings += 1
+        elements = []
+        for element in expansion:
+            if isinstance(element, Multiverse):
+                defined = [ cd for cd in element if cd.mdef ]
+                if len(defined) > 0:
+                    element = Multiverse(defined)
+            elements.append(element)
+        multiverse = Multiverse()
+        for token_cond, token_zcond, token in self.hoist_tokens(elements, False):
+            token_cond, token_zcond = self.relax(token_cond, token_zcond)
+            multiverse.append(CondDef(token_cond, token_zcond, token))
+        if len(multiverse) == 0:
+            # only empty values
+            multiverse.append(CondDef(self.T, ZSolver.T, ""))
+        return multiverse
+
+    def relax(self, cond, zcond):
+        """Relax a condition with more BDD nodes than the limit to true,
+        which over-approximates it.  The conditions of variable names
+        are kept, since a relaxed one would define or refer to the
+        variable everywhere."""
+        max_nodes = kmaxtools.settings.max_bdd_nodes
+        if self.expanding_names > 0:
+            return cond, zcond
+        if max_nodes is not None and cond is not None and bdd_size(cond) > max_nodes:
+            self.widenings += 1
+            return self.T, ZSolver.T
+        return cond, zcond
+
+    def expand_value(self, name, val, cond, zcond):
+        """Expand a definition of the named variable, token by token
+        for list variables"""
+        if kmaxtools.settings.do_token_lists and is_list_variable(name):
+            return self.expand_tokens(val, cond, zcond)
+        else:
+            return self.expand_and_flatten(val, cond, zcond)
+
     def join_values(self, value_list, delim=""):
         """Joins a list of make variable values that may be None, which
         means the variable is undefined.  When joined with defined values,
@@ -756,11 +1130,22 @@ class Kbuild:
 
         assert value is not None, value
 
+        relaxed_cond, relaxed_zcond = self.relax(presence_cond, presence_zcond)
+        if self.widened_blocks > 0 or relaxed_cond is not presence_cond:
+            # either branch of a widened block may be taken, and a
+            # relaxed presence cond may be true where the definition
+            # does not happen, so these definitions may not replace the
+            # earlier ones
+            replace_cond, replace_zcond = self.F, ZSolver.F
+            presence_cond, presence_zcond = relaxed_cond, relaxed_zcond
+        else:
+            replace_cond, replace_zcond = presence_cond, presence_zcond
+
         update_vars = lambda name: \
                     map(lambda (old_value, old_cond, old_zcond, old_flavor): 
                             VarEntry(old_value, 
-                                    conj(old_cond, neg(presence_cond)),
-                                    zconj(old_zcond, z3.Not(presence_zcond)),
+                                    conj(old_cond, neg(replace_cond)),
+                                    zconj(old_zcond, z3.Not(replace_zcond)),
                                     old_flavor), 
                         self.variables[name])
 
@@ -794,14 +1179,14 @@ class Kbuild:
                     old_variables = update_vars(equiv_name)
                 else:
                     old_variables= [VarEntry("", 
-                        neg(presence_cond), 
-                        z3.Not(presence_zcond), 
+                        neg(replace_cond), 
+                        z3.Not(replace_zcond), 
                         VarEntry.RECURSIVE)]
                     # old_variables = []
 
                 # Expand and flatten self.variables in the definition and add the
                 # resulting definitions.
-                new_definitions = self.expand_and_flatten(value, presence_cond, presence_zcond)
+                new_definitions = self.expand_value(name, value, presence_cond, presence_zcond)
                 # print equiv_name
                 # print new_definitions
                 new_variables = []
@@ -852,7 +1237,7 @@ class Kbuild:
                                 VarEntry.RECURSIVE))
 
                 if not isfalse(simply, zsimply):
-                    new_definitions = self.expand_and_flatten(value, presence_cond,presence_zcond)
+                    new_definitions = self.expand_value(name, value, presence_cond, presence_zcond)
                     # print("simply", new_definitions)
                     new_variables = []
                     for new_cond, new_zcond, new_value in new_definitions:
@@ -880,11 +1265,18 @@ class Kbuild:
         else:
             mlog.error("Unknown setvariable token: {}".format(token))
 
-        # Trim definitions with a presence cond of FALSE                    
+        # Trim definitions with a presence cond of FALSE, and relax
+        # those with too large a presence cond
         for equiv in self.get_var_equiv_set(name):
             if equiv in self.variables:
-                self.variables[equiv] = \
-                    [v for v in self.variables[equiv] if not isfalse(v.cond, v.zcond)]
+                entries = []
+                for v in self.variables[equiv]:
+                    if not isfalse(v.cond, v.zcond):
+                        cond, zcond = self.relax(v.cond, v.zcond)
+                        if cond is not v.cond:
+                            v = VarEntry(v.val, cond, zcond, v.flavor)
+                        entries.append(v)
+                self.variables[equiv] = entries
                 
 
     def process_setvariable(self, setvar, cond, zcond):
@@ -893,8 +1285,10 @@ class Kbuild:
         assert isinstance(setvar, parserdata.SetVariable), setvar
         assert z3.is_expr(zcond), zcond
 
+        widenings = self.widenings
+
         # obj-y = 'fork.o'
-        name = self.process_expansion(setvar.vnameexp)
+        name = self.process_name(setvar.vnameexp)
         token = setvar.token
         value = setvar.value
 
@@ -931,12 +1325,20 @@ class Kbuild:
         if isinstance(name, str):
             # f(name, cond, zcond)  # remove because this method for presence conditions is obsolete
             self.add_var(name, cond, zcond, token, value)
+            names = [ name ]
         else:
             for local_cond, local_zcond, expanded_name in name:
                 nested_cond = conj(local_cond, cond)
                 nested_zcond = zconj(local_zcond, zcond)
                 # f(expanded_name, nested_cond, nested_zcond)  # remove because this method for presence conditions is obsolete
                 self.add_var(expanded_name, nested_cond, nested_zcond, token, value)
+            names = [ expanded_name for _, _, expanded_name in name ]
+
+        if self.widenings > widenings or self.widened_blocks > 0:
+            # record the variables whose values were over-approximated
+            for widened_name in names:
+                if widened_name is not None:
+                    self.widened_variables.update(self.get_var_equiv_set(widened_name))
 
     def process_rule(self, rule, cond, zcond):
         # mlog.warn("just pass on rule {} {} {}".format(rule, self.bdd_to_str(cond), zcond))
@@ -950,10 +1352,9 @@ class Kbuild:
                 for include_file in include_files.split():
                     obj = os.path.dirname(include_file)
                     if os.path.exists(include_file):
-                        include_makefile = open(include_file, "rU")
-                        s = include_makefile.read()
-                        include_makefile.close()
-                        include_stmts = parser.parsestring(s, include_makefile.name)
+                        include_stmts = self.parsed_includes.get(include_file)
+                        if include_stmts is None:
+                            include_stmts = parse_cache.parsefile(include_file)
                         self.process_stmts(include_stmts, include_cond, include_zcond)
 
     def split_defs(self, var):
@@ -969,7 +1370,7 @@ class Kbuild:
             # Expand any vars used in definitions
 
             expanded_values = self.mk_Multiverse(
-                self.expand_and_flatten(value, cond, zcond))
+                self.expand_value(var, value, cond, zcond))
 
             for expanded_cond, expanded_zcond, expanded_value in expanded_values:
                 if expanded_value is None:
@@ -998,6 +1399,48 @@ class Kbuild:
         return values
                 
 
+def extract_smtlib2(makefile, defines=None):
+    """
+    extract the presence conditions from one Kbuild Makefile in this
+    process, like kmax -z, returning a dictionary from names to
+    smtlib2 strings.  this sets the global settings and bdd state, so
+    use a fresh (e.g., forked) process for each call.
+    """
+    kmaxtools.settings.defines = defines
+    kmaxtools.settings.do_boolean_configs = True
+    kmaxtools.settings.do_recursive = False
+    myrun = Run()
+    myrun.results = Results()
+    myrun.extract(makefile)
+    return myrun.results.get_smtlib2()
+
+def get_literal_includes(stmts):
+    """
+    get the files named by include statements without any variable
+    references or function calls, which can be found before evaluation
+    """
+    include_files = []
+    for s in stmts:
+        if isinstance(s, parserdata.ConditionBlock):
+            for c, block_stmts in s:
+                include_files.extend(get_literal_includes(block_stmts))
+        elif isinstance(s, parserdata.Include) and isinstance(s.exp, data.StringExpansion):
+            include_files.extend(s.exp.s.split())
+    return include_files
+
+def parse_ahead(makefile):
+    """
+    parse a makefile and the includes it names literally, for the
+    parse-ahead workers of Run.run.  returns the makefile's statements
+    and a dictionary from include files to their statements.
+    """
+    stmts = parse_cache.parsefile(makefile)
+    includes = {}
+    for include_file in get_literal_includes(stmts):
+        if include_file not in includes and os.path.isfile(include_file):
+            includes[include_file] = parse_cache.parsefile(include_file)
+    return stmts, includes
+
 class Run:    
 
     def run(self, makefiledirs):
@@ -1008,31 +1451,70 @@ class Run:
 
         self.results = Results()
 
+        # with parse_jobs, a pool of workers reads and parses the
+        # makefiles of the pending directories while the makefile
+        # before them is evaluated.  the pool is started before any
+        # bdd or solver state exists, so the workers only parse.
+        pool = None
+        if kmaxtools.settings.parse_jobs > 1 and \
+                (kmaxtools.settings.do_recursive or len(makefiledirs) > 1):
+            pool = multiprocessing.Pool(kmaxtools.settings.parse_jobs)
+        parsing = {}
+
         subdirs = set(makefiledirs)
-        while subdirs:
-            makefile = subdirs.pop()
-            mlog.info("processing makefile: {}".format(makefile))            
-            subdirs_ = self.extract(makefile)
-            if kmaxtools.settings.do_recursive:
-                subdirs = subdirs.union(subdirs_)
-
-    def extract(self, path):
+        processed = set()
+        try:
+            while subdirs:
+                if pool is not None:
+                    for subdir in subdirs:
+                        if subdir not in parsing:
+                            makefile = self.find_makefile(subdir)
+                            if makefile is not None:
+                                parsing[subdir] = pool.apply_async(parse_ahead, (makefile,))
+                    # prefer a directory whose makefile is already parsed
+                    ready = [ subdir for subdir in subdirs
+                              if subdir in parsing and parsing[subdir].ready() ]
+                    makefile = ready[0] if ready else subdirs.pop()
+                    subdirs.discard(makefile)
+                else:
+                    makefile = subdirs.pop()
+                processed.add(makefile)
+                mlog.info("processing makefile: {}".format(makefile))            
+                parsed = parsing.pop(makefile).get() if makefile in parsing else None
+                subdirs_ = self.extract(makefile, parsed)
+                if kmaxtools.settings.do_recursive:
+                    subdirs = subdirs.union(subdirs_).difference(processed)
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+
+    def extract(self, path, parsed=None):
+        """
+        extract the presence conditions from the Kbuild Makefile for the
+        given directory or file.  parsed is the result of parse_ahead for
+        it, if it was parsed ahead of time.
+        """
         makefile = self.get_makefile(path)
 
         path = os.path.dirname(makefile)
-        makefile = open(makefile, "rU")
-
-        s = makefile.read()
-        makefile.close()
 
         kbuild = Kbuild()
+        if kmaxtools.settings.directory_timeout is not None:
+            kbuild.deadline = time.time() + kmaxtools.settings.directory_timeout
         kbuild.add_definitions(kmaxtools.settings.defines)
-        stmts = parser.parsestring(s, makefile.name)
+        if parsed is not None:
+            stmts, kbuild.parsed_includes = parsed
+        else:
+            stmts = parse_cache.parsefile(makefile)
+        if kmaxtools.settings.do_slicing and not kmaxtools.settings.do_table:
+            # the symbol table shows all variables
+            kbuild.skipped_stmts = get_skipped_stmts(stmts)
 
         kbuild.process_stmts(stmts, kbuild.T, ZSolver.T)
         # SPECIAL-obj-simple uses a simply-expanded variable to expand obj-y in case obj-y is recursively-expanded, which means the variables haven't been expanded in obj-y yet, e.g., ptrace_$(BITS)
-        kbuild.process_stmts(parser.parsestring("SPECIAL-obj-simple := $(obj-y) $(obj-m)", makefile.name), kbuild.T, ZSolver.T)
-        kbuild.process_stmts(parser.parsestring("SPECIAL-core-simple := $(core-y) $(core-m) $(drivers-y) $(drivers-m) $(net-y) $(net-m) $(libs-y) $(libs-m) $(head-y) $(head-m)", makefile.name), kbuild.T, ZSolver.T)
+        kbuild.process_stmts(parser.parsestring("SPECIAL-obj-simple := $(obj-y) $(obj-m)", makefile), kbuild.T, ZSolver.T)
+        kbuild.process_stmts(parser.parsestring("SPECIAL-core-simple := $(core-y) $(core-m) $(drivers-y) $(drivers-m) $(net-y) $(net-m) $(libs-y) $(libs-m) $(head-y) $(head-m)", makefile), kbuild.T, ZSolver.T)
         
         subdirs = self.results.subdirs
         compilation_units = self.results.compilation_units
@@ -1152,8 +1634,16 @@ class Run:
         if kmaxtools.settings.do_table:
             mlog.info(kbuild.getSymbTable(printCond=kbuild.bdd_to_str))
 
+        if kbuild.deadline is not None and time.time() > kbuild.deadline:
+            mlog.warn("{}: ran out of time, so later expansions were widened token by token".format(makefile))
+        if kbuild.widenings > 0:
+            mlog.warn("{}: widened {} expansions or conditions".format(makefile, kbuild.widenings))
+
         presence_conditions = {}
-        kbuild.get_presence_conditions([ "obj-y", "obj-m", "lib-y", "lib-m", "SPECIAL-obj-simple" ], presence_conditions, kbuild.T, ZSolver.T)
+        widened = set()
+        kbuild.get_presence_conditions([ "obj-y", "obj-m", "lib-y", "lib-m", "SPECIAL-obj-simple" ], presence_conditions, kbuild.T, ZSolver.T, widened)
+        for token in widened:
+            self.results.widened_units.add(os.path.join(path, token))
         for token in presence_conditions:
             # resolve any uses of ../ or ./
             filename = os.path.join(path, token)
@@ -1163,10 +1653,12 @@ class Run:
                 self.results.presence_conditions[filename] = zdisj(self.results.presence_conditions[filename], presence_conditions[token])
 
         presence_conditions = {}
+        widened = set()
         kbuild.get_presence_conditions([ "core-y", "core-m",
                                          "drivers-y", "drivers-m", "net-y", "net-m", "libs-y",
                                          "libs-m", "head-y", "head-m", "SPECIAL-core-simple"], presence_conditions,
-                                       kbuild.T, ZSolver.T)
+                                       kbuild.T, ZSolver.T, widened)
+        self.results.widened_units.update(widened)
         for token in presence_conditions:
             filename = token
             if filename not in self.results.presence_conditions.keys():
@@ -1187,6 +1679,21 @@ class Run:
         
         return subdirs
 
+    @classmethod
+    def find_makefile(cls, path):
+        """get the makefile for a path like get_makefile, or None if
+        there is none"""
+        if os.path.isdir(path):
+            for name in ("Kbuild", "Makefile"):
+                makefile = os.path.join(path, name)
+                if os.path.isfile(makefile):
+                    return makefile
+            return None
+        elif os.path.isfile(path):
+            return path
+        else:
+            return None
+
     @classmethod
     def get_makefile(cls, path):
         #use Kbuild file if found, otherwise try Makefile
@@ -1270,7 +1777,7 @@ class Run:
                     #     kbuild.token_pc[elem] = (kbuild.T, ZSolver.T)
                     # kbuild.composite_pc[elem] = kbuild.token_pc[elem]
 
-                if os.path.isfile(unit_name[:-2] + ".c") or os.path.isfile(unit_name[:-2] + ".S"): 
+                if source_index.isfile(unit_name[:-2] + ".c") or source_index.isfile(unit_name[:-2] + ".S"): 
                     compilation_units.add(unit_name)
                     # if (elem not in kbuild.token_pc): 
                     #     kbuild.token_pc[elem] = (kbuild.T, ZSolver.T)
@@ -1289,7 +1796,7 @@ class Run:
             if not new_dir.startswith('/'):
                 new_dir = os.path.join(path, new_dir)
 
-            if os.path.isdir(new_dir):
+            if source_index.isdir(new_dir):
                 subdirs.add(new_dir)
 
             # if elem not in kbuild.token_pc:
@@ -9,6 +9,8 @@ import sys
 import kmaxtools.vcommon as CM
 
 import kmaxtools.settings
+from kmaxtools import source_index
+from kmaxtools import include_scan
 mlog = CM.getLogger(__name__, kmaxtools.settings.logger_level)
 
 class FileAnalysis:
@@ -43,27 +45,16 @@ class FileAnalysis:
 
     @staticmethod
     def get_all_c_files(path):
-        assert os.path.isdir(path)
-        cmd = 'find {} -type f | grep "\.c$" | sort | uniq'.format(path)
-        files, _ = CM.vcmd(cmd)
-        files = set([os.path.normpath(x.strip('\n'))
-                     for x in files.split()])
-        return files
+        assert source_index.isdir(path)
+        return set(source_index.walkfiles(path, ".c"))
         
     @staticmethod
     def get_included_c_files(path):
         """get source files that include c files"""
         
         path = os.path.abspath(path)
-        cmd = r'find {} -name "*.[c|h]" | xargs grep -H "^#.*include.*\.c[\">]"'.format(path)
-        rs, _  = CM.vcmd(cmd)
-        rs = [s.split(':', 1) for s in rs.split('\n') if s]
-        #search for string #include "file.c"
-        msearch = lambda s: re.search(r"\".*\.c\"", s)
-        
-        assert all(len(s) == 2 and msearch(s[1]) for s in rs), rs
-        rs = [(os.path.dirname(s[0]), msearch(s[1]).group(0)[1:-1]) for s in rs]
-        rs = set(os.path.join(fdir, fname) for fdir, fname in rs)
+        rs = include_scan.get_c_includes(path, kmaxtools.settings.include_cache_file)
+        rs = set(os.path.join(os.path.dirname(infile), fname) for infile, fname in rs)
         return rs
 
     @staticmethod
@@ -78,47 +69,33 @@ class FileAnalysis:
         st = time.time()
 
         # find all subdirs with source in them
-        import glob
-        
         unit_files = (results.compilation_units | results.library_units |
                       results.hostprog_units | results.unconfigurable_units)
         
         subdirs = set(os.path.dirname(f) for f in unit_files)
         all_c_files = set()
         for d in subdirs:
-            all_c_files.update([os.path.normpath(x) for x in glob.glob(os.path.join(d, "*.c"))])
+            all_c_files.update(source_index.listfiles(d, ".c"))
 
-        assert all(os.path.isfile(f) for f in all_c_files), all_c_files
+        assert all(source_index.isfile(f) for f in all_c_files), all_c_files
 
         # find all compilation units without a corresponding .c file
         unmatched_units = set()
         asm_compilation_units = set()
         for unit in results.compilation_units:            
             S_file = FileAnalysis.otoS(unit)
-            if os.path.isfile(S_file):
+            if source_index.isfile(S_file):
                 asm_compilation_units.add(S_file)
             else:
                 c_file = FileAnalysis.otoc(unit)
-                if not os.path.isfile(c_file):
+                if not source_index.isfile(c_file):
                     unmatched_units.add(c_file)
 
         #assert not unmatched_units, unmatched_units
         #assert not asm_compilation_units, asm_compilation_units
 
         # get source files that include c files
-        included_c_files = set()
-        out, _ = CM.vcmd(r'find . -name "*.[c|h]" | xargs grep -H "^#.*include.*\.c[\">]"')
-        for line in out.split("\n"):
-          parts = line.split(":", 1)
-          if parts is not None:
-            infile = parts[0]
-            if len(parts) > 1:
-              m = re.search(r"\".*\.c\"", parts[1])
-              if m is not None:
-                included = m.group(0)[1:-1]
-                included = os.path.join(os.path.dirname(infile), included)
-                included = os.path.relpath(os.path.realpath(included))
-                included_c_files.add(included)
+        included_c_files = include_scan.get_included_c_files(".", kmaxtools.settings.include_cache_file)
 
         # only need the files in the current source subtree
         included_c_files.intersection_update(all_c_files)
@@ -0,0 +1,32 @@
+import os
+
+# every file that kmax tools save for later runs, e.g., the tables,
+# indexes, and caches next to the formulas, is written to a pending
+# file first and then renamed into place, so readers never see a
+# partial file.  the pending file is named after the writer's process
+# id, so concurrent writers never share one.
+
+def write_file(path, write, mode='wb'):
+  """Call write(fp) on a pending file for path and rename it into
+  place.  The pending file is removed if writing fails."""
+  pending_file = "%s.pending.%d" % (path, os.getpid())
+  try:
+    with open(pending_file, mode) as fp:
+      write(fp)
+    os.rename(pending_file, path)
+  except:
+    try:
+      os.remove(pending_file)
+    except OSError:
+      pass
+    raise
+
+def write_cache_file(path, write, mode='wb'):
+  """Like write_file, but for files that are only an optimization:
+  returns False instead of raising when the file cannot be written,
+  e.g., because its directory is read-only."""
+  try:
+    write_file(path, write, mode)
+    return True
+  except (IOError, OSError):
+    return False
@@ -0,0 +1,83 @@
+import os
+import cPickle as pickle
+import z3
+
+# the backbone of the kclause formulas, i.e., the options that have
+# the same setting in every configuration of an architecture.  "core"
+# options are always on and "dead" options are always off.  kclause
+# --analyze-core computes them and saves them next to the formulas, and
+# klocalizer uses them to simplify its constraints and to answer
+# queries that need a dead option without solving.
+
+def get_backbone(constraints, names):
+  """Compute the core and dead options among the given option names
+  with incremental SAT: each candidate is checked once against the
+  negation of its setting in the first model, and every new model rules
+  out the candidates that it disagrees with.  Returns (core, dead), or
+  None if the constraints are unsatisfiable."""
+  solver = z3.Solver()
+  for constraint in constraints:
+    solver.add(constraint)
+  if solver.check() != z3.sat:
+    return None
+  model = solver.model()
+  candidates = {}
+  for name in names:
+    var = z3.Bool(name)
+    candidates[name] = z3.is_true(model.eval(var, model_completion=True))
+  core = set()
+  dead = set()
+  for name in sorted(names):
+    if name not in candidates:
+      # ruled out by a later model
+      continue
+    value = candidates.pop(name)
+    var = z3.Bool(name)
+    literal = var if value else z3.Not(var)
+    if solver.check(z3.Not(literal)) == z3.unsat:
+      if value:
+        core.add(name)
+      else:
+        dead.add(name)
+      # fixing the backbone literal helps the remaining checks
+      solver.add(literal)
+    else:
+      model = solver.model()
+      for other_name in candidates.keys():
+        if z3.is_true(model.eval(z3.Bool(other_name), model_completion=True)) != candidates[other_name]:
+          del candidates[other_name]
+  return core, dead
+
+def get_backbone_file(kclause_file):
+  return kclause_file + ".core"
+
+def write_backbone(fp, core, dead):
+  pickle.dump({ "core": sorted(core), "dead": sorted(dead) }, fp, pickle.HIGHEST_PROTOCOL)
+
+def load_backbone(kclause_file):
+  """Load the (core, dead) sets saved for the kclause formulas, or None
+  if there are none or they are older than the formulas."""
+  backbone_file = get_backbone_file(kclause_file)
+  if not os.path.exists(backbone_file) or os.path.getmtime(backbone_file) < os.path.getmtime(kclause_file):
+    return None
+  with open(backbone_file, 'rb') as fp:
+    backbone = pickle.load(fp)
+  return set(backbone["core"]), set(backbone["dead"])
+
+def get_substitutions(constraint, core, dead):
+  substitutions = []
+  for var in z3.z3util.get_vars(constraint):
+    name = str(var)
+    if name in core:
+      substitutions.append((var, z3.BoolVal(True)))
+    elif name in dead:
+      substitutions.append((var, z3.BoolVal(False)))
+  return substitutions
+
+def simplify_constraint(constraint, core, dead):
+  """Replace the core and dead options in a constraint with their
+  settings and simplify."""
+  substitutions = get_substitutions(constraint, core, dead)
+  if len(substitutions) == 0:
+    return constraint
+  return z3.simplify(z3.substitute(constraint, *substitutions))
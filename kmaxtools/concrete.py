@@ -0,0 +1,169 @@
+import os
+import re
+
+from pymake import data
+
+from kmaxtools import parse_cache
+
+# concrete evaluation of Kbuild Makefiles with pymake's own make
+# engine.  given a .config, the makefiles along a compilation unit's
+# directory path are executed with the configuration's CONFIG_ values,
+# and the unit is checked for in the resulting obj-y/obj-m lists.  this
+# confirms that a configuration includes a unit without running make or
+# a cross-compiler, e.g., to screen configurations from klocalizer before
+# building them.
+#
+# the top-level Makefile is not evaluated, so the first directory along
+# the path that has a Kbuild Makefile, e.g., drivers/ or arch/x86/, is
+# assumed to be entered from it.
+
+config_setting = re.compile(r'^(CONFIG_[A-Za-z0-9_]+)=(.*)$')
+
+# the variables that kbuild descends into subdirectories from
+subdir_variables = [ "obj-y", "obj-m", "subdir-y", "subdir-m" ]
+
+# the variables that kbuild builds compilation units from
+unit_variables = [ "obj-y", "obj-m", "lib-y", "lib-m" ]
+
+# the suffixes of the variables that list a composite's units.  kbuild
+# only adds the -m members to composites in obj-m, so foo-m is not part
+# of foo.o in obj-y.
+builtin_composite_suffixes = [ "-objs", "-y" ]
+module_composite_suffixes = [ "-objs", "-y", "-m" ]
+
+def get_composite_suffixes(variable):
+    """get the composite suffixes for the units listed in a variable"""
+    if variable.endswith("-m"):
+        return module_composite_suffixes
+    else:
+        return builtin_composite_suffixes
+
+def read_config(config_file):
+    """
+    read the options set in a .config file into a dictionary from names
+    to their values.  unset options, i.e., "# CONFIG_A is not set", are
+    left out, since make sees them as undefined.
+    """
+    config = {}
+    with open(config_file, "r") as fp:
+        for line in fp:
+            m = config_setting.match(line.rstrip("\n"))
+            if m is not None:
+                config[m.group(1)] = m.group(2)
+    return config
+
+def get_makefile(path):
+    """get the Kbuild file or Makefile for a directory, or None"""
+    for name in ("Kbuild", "Makefile"):
+        makefile = os.path.join(path, name)
+        if os.path.isfile(makefile):
+            return makefile
+    return None
+
+def evaluate_makefile(makefile, config, defines=None):
+    """
+    execute a Kbuild Makefile with the given configuration and return
+    pymake's data.Makefile.  obj and src are set to the makefile's
+    directory and srctree to the current directory, as kbuild does, and
+    defines (name=value strings) are set like command-line variables.
+    """
+    path = os.path.dirname(makefile)
+    mk = data.Makefile(workdir=os.getcwd(), env={})
+    variables = mk.variables
+    for name, value in ([ ("srctree", "."), ("obj", path), ("src", path) ]):
+        variables.set(name, data.Variables.FLAVOR_SIMPLE,
+                      data.Variables.SOURCE_COMMANDLINE, value)
+    if defines:
+        for define in defines:
+            name, value = define.split("=", 1)
+            variables.set(name, data.Variables.FLAVOR_SIMPLE,
+                          data.Variables.SOURCE_COMMANDLINE, value, force=True)
+    # kbuild includes the configuration as a makefile
+    for name, value in config.iteritems():
+        variables.set(name, data.Variables.FLAVOR_SIMPLE,
+                      data.Variables.SOURCE_MAKEFILE, value)
+    stmts = parse_cache.parsefile(makefile)
+    stmts.execute(mk)
+    return mk
+
+def get_values(mk, name):
+    """get the whitespace-delimited tokens of a variable's value"""
+    flavor, source, value = mk.variables.get(name)
+    if value is None:
+        return []
+    return value.resolvesplit(mk, mk.variables, [name])
+
+def contains_unit(mk, tokens, unit_name, visited, composite_suffixes):
+    """
+    check whether unit_name is among the tokens, either directly or as a
+    part of a composite, e.g., foo.o with foo-y := unit_name, looking for
+    the composite's units in the variables with composite_suffixes
+    """
+    for token in tokens:
+        if token == unit_name:
+            return True
+        if token.endswith(".o") and token not in visited:
+            visited.add(token)
+            composite = token[:-len(".o")]
+            for suffix in composite_suffixes:
+                if contains_unit(mk, get_values(mk, composite + suffix), unit_name, visited, composite_suffixes):
+                    return True
+    return False
+
+def find_in_variables(mk, variables, name):
+    """find the first of the variables that includes name"""
+    for variable in variables:
+        if contains_unit(mk, get_values(mk, variable), name, set(), get_composite_suffixes(variable)):
+            return variable
+    return None
+
+def evaluate_unit(unit, config, defines=None):
+    """
+    evaluate the Kbuild Makefiles along the path to a compilation unit,
+    e.g., drivers/block/loop.o, under a configuration from read_config.
+
+    returns a list of (path, makefile, variable) steps, one for each
+    subdirectory and finally the unit itself, where variable is the
+    variable of the makefile that includes the path, e.g., obj-y, or
+    None when it is not included.  evaluation stops at the first path
+    that is not included, so the unit is included when the last
+    step's variable is not None.  the first directory with a Kbuild
+    Makefile is assumed to be included by the top-level Makefile, and
+    has the step (path, None, "top-level").
+    """
+    unit = os.path.normpath(unit)
+    components = unit.split(os.sep)
+    steps = []
+    parent = None
+    for i in range(1, len(components)):
+        path = os.path.join(*components[:i]) + os.sep
+        if get_makefile(path) is None:
+            # e.g., arch/, or obj-y += a/b/ with no makefile in a/
+            continue
+        if parent is None:
+            steps.append((path, None, "top-level"))
+            parent = path
+            continue
+        makefile = get_makefile(parent)
+        mk = evaluate_makefile(makefile, config, defines)
+        subdir = os.path.relpath(path, parent)
+        variable = find_in_variables(mk, subdir_variables, subdir + os.sep)
+        if variable is None:
+            # subdir-y usually leaves off the trailing slash
+            variable = find_in_variables(mk, [ "subdir-y", "subdir-m" ], subdir)
+        steps.append((path, makefile, variable))
+        if variable is None:
+            return steps
+        parent = path
+    if parent is None:
+        # not in any directory with a Kbuild Makefile
+        steps.append((unit, None, None))
+        return steps
+    makefile = get_makefile(parent)
+    mk = evaluate_makefile(makefile, config, defines)
+    variable = find_in_variables(mk, unit_variables, os.path.relpath(unit, parent))
+    steps.append((unit, makefile, variable))
+    return steps
+
+def is_included(steps):
+    return len(steps) > 0 and steps[-1][2] is not None
@@ -24,6 +24,7 @@ def conj(a, b): return None if a is None or b is None else a & b
 def disj(a, b): return None if a is None or b is None else a | b
 def neg(a): return None if a is None else ~a
 def isbddfalse(b): return b == bdd_lib.false
+def bdd_size(b): return b.dag_size
 
 def bdd_solutions(b):
     d = bdd_lib.pick(b)
@@ -146,18 +147,24 @@ class Results:
         self.extra_targets = set()
         self.clean_files = set()
         self.c_file_targets = set()
+        # units whose presence conditions were over-approximated
+        self.widened_units = set()
         # self.unit_pcs = set()
         # self.subdir_pcs = set()
         self.presence_conditions = {}
 
+    def get_smtlib2(self):
+        """map each name to its presence condition in smtlib2 format"""
+        z3_pcs = {}
+        for filename in self.presence_conditions.keys():
+            solver = z3.Solver()
+            solver.add(self.presence_conditions[filename])
+            z3_pcs[filename] = solver.to_smt2()
+        return z3_pcs
+
     def __str__(self, details=False):
         if kmaxtools.settings.output_smtlib2:
-            z3_pcs = {}
-            for filename in self.presence_conditions.keys():
-                solver = z3.Solver()
-                solver.add(self.presence_conditions[filename])
-                z3_pcs[filename] = solver.to_smt2()
-            return pickle.dumps(z3_pcs)
+            return pickle.dumps(self.get_smtlib2())
         else:
             f = lambda k, s: "{}: {}".format(k, ', '.join(s) if details else len(s))
             delim = '\n' if details else ', '
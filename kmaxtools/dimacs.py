@@ -0,0 +1,176 @@
+import z3
+
+# tseitin encoding of z3 boolean formulas into dimacs cnf.  each
+# subformula of the constraint dag gets one auxiliary variable that is
+# defined by an equivalence to its operands, so the cnf stays linear in
+# the size of the dag and every auxiliary variable is functionally
+# determined by the named variables.  this keeps the number of
+# satisfying assignments the same as the original formula, which
+# matters for #sat and uniform sampling tools.
+
+class EncodingError(Exception):
+  pass
+
+class DimacsEncoder:
+  def __init__(self):
+    # named variables and auxiliary variables share one numbering
+    self.varnums = {}
+    self.num_vars = 0
+    self.clauses = []
+    self.seen_clauses = set()
+    # z3 ast id -> (expr, literal).  the expr is kept so that z3 does
+    # not recycle the id while we still use it as a key.
+    self.literals = {}
+    self.true_literal = None
+
+  def lookup_varnum(self, name):
+    """Get the dimacs variable number for a named variable, creating it if needed."""
+    if name not in self.varnums:
+      self.num_vars += 1
+      self.varnums[name] = self.num_vars
+    return self.varnums[name]
+
+  def new_aux_var(self):
+    self.num_vars += 1
+    return self.num_vars
+
+  def add_clause(self, clause):
+    """Add a clause as a list of nonzero integer literals.  Duplicate
+    literals, tautologies, and duplicate clauses are dropped."""
+    lits = set(clause)
+    for lit in lits:
+      if -lit in lits:
+        return
+    key = tuple(sorted(lits, key=abs))
+    if key not in self.seen_clauses:
+      self.seen_clauses.add(key)
+      self.clauses.append(key)
+
+  def get_true_literal(self):
+    if self.true_literal is None:
+      self.true_literal = self.new_aux_var()
+      self.add_clause([self.true_literal])
+    return self.true_literal
+
+  def is_atom(self, expr):
+    if z3.is_true(expr) or z3.is_false(expr):
+      return False
+    if z3.is_not(expr) or z3.is_and(expr) or z3.is_or(expr) or z3.is_implies(expr):
+      return False
+    kind = expr.decl().kind()
+    if kind == z3.Z3_OP_XOR or kind == z3.Z3_OP_ITE:
+      return False
+    if (z3.is_eq(expr) or z3.is_distinct(expr)) and expr.num_args() == 2 and z3.is_bool(expr.arg(0)):
+      return False
+    return True
+
+  def atom_name(self, expr):
+    """Get the name of an atom's variable, with any whitespace replaced,
+    since dimacs comments are whitespace-delimited, e.g., for kclause's
+    PREDICATE_Compare(Name('CONFIG_N'), [('>', Const('2'))])"""
+    if z3.is_const(expr) and expr.decl().kind() == z3.Z3_OP_UNINTERPRETED:
+      name = str(expr)
+    else:
+      # unsupported predicates, e.g., nonboolean comparisons, become
+      # free variables, as in expression_converter
+      name = "PREDICATE_%s" % (str(expr))
+    return "_".join(name.split())
+
+  def literal(self, root):
+    """Get the literal standing for the given boolean expression,
+    emitting the defining clauses for any subformulas not yet encoded."""
+    # iterative post-order traversal, since kclause expressions can be
+    # deeper than python's recursion limit
+    stack = [ (root, False) ]
+    while len(stack) > 0:
+      expr, expanded = stack.pop()
+      expr_id = expr.get_id()
+      if expr_id in self.literals:
+        continue
+      if self.is_atom(expr) or z3.is_true(expr) or z3.is_false(expr):
+        self.literals[expr_id] = (expr, self.encode(expr, []))
+      elif not expanded:
+        stack.append((expr, True))
+        for child in expr.children():
+          if child.get_id() not in self.literals:
+            stack.append((child, False))
+      else:
+        child_lits = [ self.literals[child.get_id()][1] for child in expr.children() ]
+        self.literals[expr_id] = (expr, self.encode(expr, child_lits))
+    return self.literals[root.get_id()][1]
+
+  def encode(self, expr, args):
+    """Define a literal for one node given the literals of its children."""
+    if z3.is_true(expr):
+      return self.get_true_literal()
+    elif z3.is_false(expr):
+      return -self.get_true_literal()
+    elif self.is_atom(expr):
+      return self.lookup_varnum(self.atom_name(expr))
+    elif z3.is_not(expr):
+      return -args[0]
+    elif z3.is_and(expr):
+      return self.encode_and(args)
+    elif z3.is_or(expr):
+      return -self.encode_and([ -a for a in args ])
+    elif z3.is_implies(expr):
+      return -self.encode_and([ args[0], -args[1] ])
+    elif z3.is_eq(expr):
+      return self.encode_iff(args[0], args[1])
+    elif z3.is_distinct(expr) or expr.decl().kind() == z3.Z3_OP_XOR:
+      return -self.encode_iff(args[0], args[1])
+    elif expr.decl().kind() == z3.Z3_OP_ITE:
+      return self.encode_ite(args[0], args[1], args[2])
+    else:
+      raise EncodingError("unexpected expression in dimacs encoding: %s" % (expr))
+
+  def encode_and(self, args):
+    if len(args) == 1:
+      return args[0]
+    x = self.new_aux_var()
+    for a in args:
+      self.add_clause([ -x, a ])
+    self.add_clause([ x ] + [ -a for a in args ])
+    return x
+
+  def encode_iff(self, a, b):
+    x = self.new_aux_var()
+    self.add_clause([ -x, -a, b ])
+    self.add_clause([ -x, a, -b ])
+    self.add_clause([ x, a, b ])
+    self.add_clause([ x, -a, -b ])
+    return x
+
+  def encode_ite(self, c, t, e):
+    x = self.new_aux_var()
+    self.add_clause([ -x, -c, t ])
+    self.add_clause([ -x, c, e ])
+    self.add_clause([ x, -c, -t ])
+    self.add_clause([ x, c, -e ])
+    return x
+
+  def add_constraint(self, expr):
+    """Assert a z3 boolean expression.  Top-level conjunctions and
+    disjunctions become clauses directly instead of getting an
+    auxiliary variable."""
+    if z3.is_true(expr):
+      pass
+    elif z3.is_and(expr):
+      for child in expr.children():
+        self.add_constraint(child)
+    elif z3.is_or(expr):
+      self.add_clause([ self.literal(child) for child in expr.children() ])
+    elif z3.is_implies(expr):
+      self.add_clause([ -self.literal(expr.arg(0)), self.literal(expr.arg(1)) ])
+    else:
+      self.add_clause([ self.literal(expr) ])
+
+  def write(self, fp, comments=None):
+    """Write the cnf in dimacs format.  comments is a list of comment
+    lines (without the leading "c ") printed before the problem line."""
+    if comments is not None:
+      for comment in comments:
+        fp.write("c %s\n" % (comment))
+    fp.write("p cnf %d %d\n" % (self.num_vars, len(self.clauses)))
+    for clause in self.clauses:
+      fp.write("%s 0\n" % (" ".join([ str(lit) for lit in clause ])))
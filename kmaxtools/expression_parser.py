@@ -0,0 +1,221 @@
+import re
+
+# parser for the expression language emitted by kconfig_extractor,
+# e.g., "(CONFIG_A and not CONFIG_B or CONFIG_C==\"x86\")".  operator
+# precedence follows python, since expression_converter hands these
+# same strings to python's parser: or < and < not < comparison.
+#
+# trees are nested tuples, so they can be compared and hashed
+# structurally:
+#
+#   ("const", "1")                  true, false is ("const", "0")
+#   ("atom", text)                  config var, string, or number
+#   ("not", tree)
+#   ("and", (tree, tree, ...))      always flattened, at least two operands
+#   ("or", (tree, tree, ...))       always flattened, at least two operands
+#   ("cmp", op, tree, tree)         ==, !=, <, <=, >, >=
+
+TRUE = ("const", "1")
+FALSE = ("const", "0")
+
+class ParseError(Exception):
+  pass
+
+token_pattern = re.compile(r'\s*(?:(\()|(\))|("(?:[^"\\]|\\.)*")|(==|!=|<=|>=|<|>)|([^\s()"=!<>]+))')
+int_pattern = re.compile(r'^[0-9]+$')
+hex_pattern = re.compile(r'^0x[0-9A-Fa-f]+$')
+
+def tokenize(expr):
+  """Split an expression into a list of (kind, text) tokens, where kind
+  is one of "(", ")", "string", "op", and "word"."""
+  tokens = []
+  pos = 0
+  end = len(expr.rstrip())
+  while pos < end:
+    m = token_pattern.match(expr, pos)
+    if m is None or m.end() == pos:
+      raise ParseError("unexpected character at %d in %s" % (pos, expr))
+    lparen, rparen, string, op, word = m.groups()
+    if lparen is not None:
+      tokens.append(("(", lparen))
+    elif rparen is not None:
+      tokens.append((")", rparen))
+    elif string is not None:
+      tokens.append(("string", string))
+    elif op is not None:
+      tokens.append(("op", op))
+    else:
+      tokens.append(("word", word))
+    pos = m.end()
+  return tokens
+
+class Parser:
+  def __init__(self, tokens):
+    self.tokens = tokens
+    self.pos = 0
+
+  def peek(self):
+    if self.pos < len(self.tokens):
+      return self.tokens[self.pos]
+    else:
+      return (None, None)
+
+  def next(self):
+    token = self.peek()
+    self.pos += 1
+    return token
+
+  def parse(self):
+    tree = self.parse_or()
+    if self.pos != len(self.tokens):
+      raise ParseError("unexpected token %s" % (self.peek()[1]))
+    return tree
+
+  def parse_or(self):
+    operands = [ self.parse_and() ]
+    while self.peek() == ("word", "or"):
+      self.next()
+      operands.append(self.parse_and())
+    return make_or(operands, fold=False)
+
+  def parse_and(self):
+    operands = [ self.parse_not() ]
+    while self.peek() == ("word", "and"):
+      self.next()
+      operands.append(self.parse_not())
+    return make_and(operands, fold=False)
+
+  def parse_not(self):
+    if self.peek() == ("word", "not"):
+      self.next()
+      return ("not", self.parse_not())
+    else:
+      return self.parse_comparison()
+
+  def parse_comparison(self):
+    left = self.parse_primary()
+    if self.peek()[0] == "op":
+      op = self.next()[1]
+      right = self.parse_primary()
+      return ("cmp", op, left, right)
+    elif left[0] == "atom" and int_pattern.match(left[1]):
+      # only a number standing alone as a boolean operand is a constant
+      return TRUE if int(left[1]) != 0 else FALSE
+    else:
+      return left
+
+  def parse_primary(self):
+    kind, text = self.next()
+    if kind == "(":
+      tree = self.parse_or()
+      if self.next()[0] != ")":
+        raise ParseError("missing close parenthesis")
+      return tree
+    elif kind == "string":
+      return ("atom", text)
+    elif kind == "word" and text not in ("and", "or", "not"):
+      return ("atom", text)
+    else:
+      raise ParseError("unexpected token %s" % (text))
+
+def parse(expr):
+  """Parse an expression string into a tree.  Raises ParseError."""
+  return Parser(tokenize(expr)).parse()
+
+def to_string(tree):
+  """Render a tree back into the expression language."""
+  kind = tree[0]
+  if kind == "const" or kind == "atom":
+    return tree[1]
+  elif kind == "not":
+    return "(not %s)" % (to_string(tree[1]))
+  elif kind == "and" or kind == "or":
+    return "(%s)" % ((" %s " % (kind)).join([ to_string(child) for child in tree[1] ]))
+  elif kind == "cmp":
+    return "(%s %s %s)" % (to_string(tree[2]), tree[1], to_string(tree[3]))
+
+def conjuncts(tree):
+  if tree[0] == "and":
+    return list(tree[1])
+  else:
+    return [ tree ]
+
+def disjuncts(tree):
+  if tree[0] == "or":
+    return list(tree[1])
+  else:
+    return [ tree ]
+
+def make_junction(kind, operands, unit, zero, fold):
+  flattened = []
+  seen = set()
+  for operand in operands:
+    for child in (operand[1] if operand[0] == kind else (operand,)):
+      if fold:
+        if child == zero:
+          return zero
+        elif child == unit or child in seen:
+          continue
+        seen.add(child)
+      flattened.append(child)
+  if len(flattened) == 0:
+    return unit
+  elif len(flattened) == 1:
+    return flattened[0]
+  else:
+    return (kind, tuple(flattened))
+
+def make_and(operands, fold=True):
+  """Conjoin trees, flattening nested conjunctions.  With fold, also
+  drop duplicate and true operands and fold false."""
+  return make_junction("and", operands, TRUE, FALSE, fold)
+
+def make_or(operands, fold=True):
+  """Disjoin trees, flattening nested disjunctions.  With fold, also
+  drop duplicate and false operands and fold true."""
+  return make_junction("or", operands, FALSE, TRUE, fold)
+
+def make_not(tree):
+  if tree == TRUE:
+    return FALSE
+  elif tree == FALSE:
+    return TRUE
+  else:
+    return ("not", tree)
+
+def replace_factors(tree, factors):
+  """Replace the conjunction of the given factors with true wherever it
+  appears in the tree, including as a subset of a larger conjunction,
+  folding constants as it goes."""
+  if len(factors) == 1 and tree in factors:
+    return TRUE
+  elif tree[0] == "and":
+    children = [ replace_factors(child, factors) for child in tree[1] ]
+    if factors.issubset(children):
+      children = [ child for child in children if child not in factors ]
+    return make_and(children)
+  elif tree[0] == "or":
+    return make_or([ replace_factors(child, factors) for child in tree[1] ])
+  elif tree[0] == "not":
+    return make_not(replace_factors(tree[1], factors))
+  else:
+    return tree
+
+def get_identifiers(tree):
+  """Get the config var names used in a tree."""
+  identifiers = []
+  stack = [ tree ]
+  while len(stack) > 0:
+    node = stack.pop()
+    kind = node[0]
+    if kind == "atom":
+      if not node[1].startswith('"') and not hex_pattern.match(node[1]) and not int_pattern.match(node[1]):
+        identifiers.append(node[1])
+    elif kind == "not":
+      stack.append(node[1])
+    elif kind == "and" or kind == "or":
+      stack.extend(node[1])
+    elif kind == "cmp":
+      stack.append(node[2])
+      stack.append(node[3])
+  return identifiers
@@ -0,0 +1,123 @@
+import os
+import re
+import mmap
+import multiprocessing
+import cPickle as pickle
+
+from kmaxtools import atomic_file
+from kmaxtools import source_index
+
+# finds the .c files that other source files #include, e.g., drivers that
+# #include "foo_core.c", which kmaxall and FileAnalysis leave out of the
+# .c files without a compilation unit.  this does in-process what
+#
+#   find . -name "*.[c|h]" | xargs grep -H "^#.*include.*\.c[\">]"
+#
+# followed by a search for ".*\.c" on each matching line did.  files are
+# mapped with mmap and scanned by a pool of worker processes, and a
+# file without any '.c"' is skipped after one byte search.  the results
+# are cached per file by mtime and size, so that later scans only read
+# the files that changed.
+
+# change this when the cache's data structures change
+version = "1"
+
+include_line = re.compile(r'^#.*include.*\.c[">]', re.MULTILINE)
+quoted_c_file = re.compile(r'".*\.c"')
+
+def scan_file(path):
+    """get the names of the .c files that a file #includes in quotes"""
+    with open(path, 'rb') as fp:
+        if os.fstat(fp.fileno()).st_size == 0:
+            # mmap cannot map an empty file
+            return []
+        mm = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if mm.find('.c"') == -1:
+                return []
+            names = []
+            for m in include_line.finditer(mm):
+                end = mm.find('\n', m.end())
+                line = mm[m.start():end if end != -1 else len(mm)]
+                quoted = quoted_c_file.search(line)
+                if quoted is not None:
+                    names.append(quoted.group(0)[1:-1])
+            return names
+        finally:
+            mm.close()
+
+def scan_worker(work):
+    """scan a file unless its mtime and size match the cached ones.
+    returns the path and its new cache entry, which is None if the
+    cached entry is still good, or False if the file is gone"""
+    path, cached_stamp = work
+    try:
+        st = os.stat(path)
+    except OSError:
+        return path, False
+    stamp = (st.st_mtime, st.st_size)
+    if stamp == cached_stamp:
+        return path, None
+    try:
+        names = scan_file(path)
+    except (IOError, OSError, ValueError):
+        names = []
+    return path, (stamp, names)
+
+def load_cache(cache_file):
+    if cache_file is None or not os.path.exists(cache_file):
+        return {}
+    try:
+        with open(cache_file, 'rb') as fp:
+            saved_version, cache = pickle.load(fp)
+    except (IOError, EOFError, pickle.UnpicklingError, ValueError):
+        return {}
+    if saved_version != version:
+        return {}
+    return cache
+
+def write_cache(cache_file, cache):
+    atomic_file.write_cache_file(cache_file, lambda fp: pickle.dump((version, cache), fp, pickle.HIGHEST_PROTOCOL))
+
+def get_c_includes(path, cache_file=None, jobs=None):
+    """
+    scan the .c and .h files under path for #includes of .c files in
+    quotes, returning a list of (including file, included name) pairs.
+    the cache in cache_file, if any, is updated.
+    """
+    files = source_index.walkfiles(path, ".c") + source_index.walkfiles(path, ".h")
+    cache = load_cache(cache_file)
+    work = [ (f, cache[f][0] if f in cache else None) for f in files ]
+    pool = multiprocessing.Pool(jobs)
+    try:
+        changed = False
+        for f, entry in pool.imap_unordered(scan_worker, work, chunksize=256):
+            if entry is False:
+                cache.pop(f, None)
+                changed = True
+            elif entry is not None:
+                cache[f] = entry
+                changed = True
+    finally:
+        pool.close()
+        pool.join()
+    # forget the files under path that are gone
+    file_set = set(files)
+    path = os.path.normpath(path)
+    for f in [ f for f in cache if f not in file_set and source_index.is_under(f, path) ]:
+        del cache[f]
+        changed = True
+    if cache_file is not None and changed:
+        write_cache(cache_file, cache)
+    return [ (f, name) for f in files if f in cache for name in cache[f][1] ]
+
+def get_included_c_files(path, cache_file=None, jobs=None):
+    """
+    get the .c files #included by the .c and .h files under path,
+    resolved relative to the current directory like os.path.relpath
+    """
+    included_c_files = set()
+    for infile, name in get_c_includes(path, cache_file, jobs):
+        included = os.path.join(os.path.dirname(infile), name)
+        included_c_files.add(os.path.relpath(os.path.realpath(included)))
+    return included_c_files
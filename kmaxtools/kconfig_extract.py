@@ -0,0 +1,26 @@
+# run the kconfig_extractor python extension for an architecture.  see
+# docs/kconfig_extract_format.md for the output format.
+
+def get_srcarch(arch):
+  srcarch = {
+    "x86_64" : "x86",
+    "i386" : "x86",
+    "sparc64" : "sparc",
+    "sparc" : "sparc",
+    "sh64" : "sh",
+    "sh" : "sh",
+  }
+
+  if arch in srcarch.keys():
+    return srcarch[arch]
+  else:
+    return arch
+
+def extract_kconfig(arch, kconfig="Kconfig"):
+  """Extract the Kconfig dependencies for the given architecture from
+  the source tree in the current directory, returning the
+  kconfig_extract text.  Raises kconfig_extractor.error on failure."""
+  # imported here so that tools that only read existing formulas do
+  # not need the extension
+  import kconfig_extractor
+  return kconfig_extractor.extract_kconfig_buffer(arch, get_srcarch(arch), kconfig)
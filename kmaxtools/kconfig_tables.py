@@ -0,0 +1,137 @@
+import os
+import struct
+import array
+
+from kmaxtools import atomic_file
+
+# compact binary form of the per-option metadata in a kconfig_extract
+# file, i.e., the option types, which options have prompts, and which
+# have nonboolean defaults.  see docs/kconfig_extract_format.md.
+#
+# layout, all integers little-endian:
+#
+#   magic             8 bytes, "KMAXTBL1"
+#   header            num_options, num_types, type_names_len, names_len (4 x uint32)
+#   type names        newline-separated type names, e.g., bool, tristate
+#   option names      newline-separated option names, sorted
+#   type codes        one byte per option, indexing into the type names
+#   visible           bitset, one bit per option, set if it has a prompt
+#   has def_nonbool   bitset, one bit per option
+
+magic = "KMAXTBL1"
+header_format = "<IIII"
+
+class KconfigTables:
+  def __init__(self, names, type_names, type_codes, visible_bits, def_nonbool_bits):
+    self.names = names
+    self.type_names = type_names
+    self.type_codes = type_codes
+    self.visible_bits = visible_bits
+    self.def_nonbool_bits = def_nonbool_bits
+
+  def get_kconfig_types(self):
+    """Map each option name to its type name."""
+    type_names = self.type_names
+    return dict(zip(self.names, [ type_names[code] for code in self.type_codes ]))
+
+  def get_kconfig_visible(self):
+    """The set of options that have a prompt."""
+    return set(get_bitset_members(self.names, self.visible_bits))
+
+  def get_kconfig_has_def_nonbool(self):
+    """The set of options that have a nonboolean default."""
+    return set(get_bitset_members(self.names, self.def_nonbool_bits))
+
+def get_bitset_members(names, bits):
+  members = []
+  for byte_i in xrange(len(bits)):
+    byte = bits[byte_i]
+    if byte != 0:
+      for bit_i in xrange(8):
+        if byte & (1 << bit_i):
+          members.append(names[byte_i * 8 + bit_i])
+  return members
+
+def make_bitset(names, member_set):
+  bits = array.array('B', [ 0 ] * ((len(names) + 7) / 8))
+  for i in xrange(len(names)):
+    if names[i] in member_set:
+      bits[i / 8] |= 1 << (i % 8)
+  return bits
+
+def read_kconfig_extract(fp):
+  """Build tables from the config, prompt, and def_nonbool lines of a
+  kconfig_extract text file."""
+  types = {}
+  visible = set()
+  has_def_nonbool = set()
+  for line in fp:
+    fields = line.split(" ", 3)
+    if len(fields) < 2:
+      continue
+    instr = fields[0]
+    if instr == "config":
+      types[fields[1]] = fields[2].strip()
+    elif instr == "prompt":
+      visible.add(fields[1])
+    elif instr == "def_nonbool":
+      has_def_nonbool.add(fields[1])
+  names = sorted(types.keys())
+  type_names = sorted(set(types.values()))
+  type_index = dict([ (type_names[i], i) for i in range(len(type_names)) ])
+  type_codes = array.array('B', [ type_index[types[name]] for name in names ])
+  return KconfigTables(names, type_names, type_codes, make_bitset(names, visible), make_bitset(names, has_def_nonbool))
+
+def write_tables(fp, tables):
+  type_names_blob = "\n".join(tables.type_names)
+  names_blob = "\n".join(tables.names)
+  fp.write(magic)
+  fp.write(struct.pack(header_format, len(tables.names), len(tables.type_names), len(type_names_blob), len(names_blob)))
+  fp.write(type_names_blob)
+  fp.write(names_blob)
+  fp.write(tables.type_codes.tostring())
+  fp.write(tables.visible_bits.tostring())
+  fp.write(tables.def_nonbool_bits.tostring())
+
+def load_tables(fp):
+  """Load tables written by write_tables() with a single read.  Returns
+  None if the file is not in the tables format."""
+  data = fp.read()
+  if not data.startswith(magic):
+    return None
+  offset = len(magic)
+  num_options, num_types, type_names_len, names_len = struct.unpack_from(header_format, data, offset)
+  offset += struct.calcsize(header_format)
+  type_names = data[offset:offset + type_names_len].split("\n") if num_types > 0 else []
+  offset += type_names_len
+  names = data[offset:offset + names_len].split("\n") if num_options > 0 else []
+  offset += names_len
+  bitset_len = (num_options + 7) / 8
+  type_codes = array.array('B', data[offset:offset + num_options])
+  offset += num_options
+  visible_bits = array.array('B', data[offset:offset + bitset_len])
+  offset += bitset_len
+  def_nonbool_bits = array.array('B', data[offset:offset + bitset_len])
+  return KconfigTables(names, type_names, type_codes, visible_bits, def_nonbool_bits)
+
+def get_tables_file(kconfig_extract_file):
+  return kconfig_extract_file + ".tables"
+
+def get_kconfig_tables(kconfig_extract_file):
+  """Get the tables for a kconfig_extract file, loading them from the
+  .tables file next to it when it is up to date, or else reading the
+  text file and saving the .tables file for next time.  Returns None
+  if there is no kconfig_extract file."""
+  tables_file = get_tables_file(kconfig_extract_file)
+  if os.path.exists(tables_file) and \
+     (not os.path.exists(kconfig_extract_file) or os.path.getmtime(tables_file) >= os.path.getmtime(kconfig_extract_file)):
+    with open(tables_file, 'rb') as fp:
+      tables = load_tables(fp)
+    if tables is not None:
+      return tables
+  if not os.path.exists(kconfig_extract_file):
+    return None
+  with open(kconfig_extract_file, 'r') as fp:
+    tables = read_kconfig_extract(fp)
+  atomic_file.write_cache_file(tables_file, lambda fp: write_tables(fp, tables))
+  return tables
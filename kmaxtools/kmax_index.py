@@ -0,0 +1,61 @@
+import os
+import cPickle as pickle
+
+from kmaxtools import atomic_file
+
+# index from normalized paths to the keys of the kmax formulas.  kbuild
+# keys keep the paths as the makefiles spell them, e.g.,
+# "arch/x86/../../virt/kvm/kvm_main.o" or "drivers/./block/", to
+# preserve the conditions on each directory along the way, while users
+# ask for "virt/kvm/kvm_main.o".  the index maps each normalized path
+# to all of the kbuild keys that resolve to it.  subdirectories keep
+# their trailing slash, which distinguishes them from compilation units
+# in kbuild.
+#
+# kmaxall --resolved-index writes it next to the kmax formulas, and
+# klocalizer rebuilds it when it is missing or older than the formulas.
+
+def normalize_kbuild_path(path):
+  """Resolve ./ and ../ in a relative kbuild path without touching the
+  filesystem, keeping the trailing slash of subdirectories."""
+  normalized = os.path.normpath(path)
+  if path.endswith("/") and not normalized.endswith("/"):
+    normalized = normalized + "/"
+  return normalized
+
+def build_index(kmax):
+  """Map each normalized path to the sorted list of kmax keys that
+  resolve to it."""
+  index = {}
+  for key in kmax:
+    index.setdefault(normalize_kbuild_path(key), []).append(key)
+  for keys in index.itervalues():
+    keys.sort()
+  return index
+
+def dump_index(index, fp):
+  pickle.dump(index, fp, pickle.HIGHEST_PROTOCOL)
+
+def write_index(index_file, index):
+  atomic_file.write_file(index_file, lambda fp: dump_index(index, fp))
+
+def get_index_file(kmax_file):
+  return kmax_file + ".index"
+
+def get_kmax_index(kmax_file, kmax):
+  """Get the index for the given kmax formulas, loading it from the
+  .index file next to kmax_file when it is up to date, or else building
+  it and saving it for next time."""
+  index_file = get_index_file(kmax_file)
+  if os.path.exists(index_file) and os.path.getmtime(index_file) >= os.path.getmtime(kmax_file):
+    with open(index_file, 'rb') as fp:
+      return pickle.load(fp)
+  index = build_index(kmax)
+  atomic_file.write_cache_file(index_file, lambda fp: dump_index(index, fp))
+  return index
+
+def resolve_kbuild_paths(index, paths):
+  """Look up several paths at once, returning a dictionary from each
+  path to the list of kmax keys it resolves to, which is empty when
+  there are none."""
+  return dict([ (path, index.get(normalize_kbuild_path(path), [])) for path in paths ])
@@ -0,0 +1,59 @@
+import os
+import hashlib
+import cPickle as pickle
+
+from pymake import parser
+
+import kmaxtools.settings
+from kmaxtools import atomic_file
+
+# on-disk cache of parsed makefiles.  each parserdata.StatementList is
+# pickled under the sha1 of its path and contents, so a changed file
+# gets a new entry and entries are never updated in place.  entries are
+# written to a temporary file and renamed, so concurrent kmax processes
+# only ever see complete entries.  the cache is off unless
+# kmaxtools.settings.parse_cache_dir is set, e.g., by kmax --parse-cache.
+
+# change this when the parser's data structures change
+version = "1"
+
+def get_cache_file(cache_dir, filename, s):
+    key = hashlib.sha1("%s\0%s\0%s" % (version, filename, s)).hexdigest()
+    return os.path.join(cache_dir, key[:2], key)
+
+def parsestring(s, filename, cache_dir=None):
+    """
+    parse makefile contents like parser.parsestring, reusing the cached
+    parse of the same path and contents if there is one
+    """
+    if cache_dir is None:
+        cache_dir = kmaxtools.settings.parse_cache_dir
+    if cache_dir is None:
+        return parser.parsestring(s, filename)
+
+    cache_file = get_cache_file(cache_dir, filename, s)
+    if os.path.exists(cache_file):
+        try:
+            with open(cache_file, 'rb') as fp:
+                return pickle.load(fp)
+        except Exception:
+            # a corrupt or incompatible entry, so parse again and replace it
+            pass
+
+    stmts = parser.parsestring(s, filename)
+    cache_subdir = os.path.dirname(cache_file)
+    if not os.path.isdir(cache_subdir):
+        try:
+            os.makedirs(cache_subdir)
+        except OSError:
+            # another process may have created it, or else the write
+            # below fails too
+            pass
+    atomic_file.write_cache_file(cache_file, lambda fp: pickle.dump(stmts, fp, pickle.HIGHEST_PROTOCOL))
+    return stmts
+
+def parsefile(path, cache_dir=None):
+    """read and parse a makefile, using the cache"""
+    with open(path, "rU") as fp:
+        s = fp.read()
+    return parsestring(s, path, cache_dir)
@@ -0,0 +1,227 @@
+import random
+import itertools
+import multiprocessing
+import traceback
+import z3
+
+# configuration sampling on one incremental solver.  every sample is
+# blocked after it is generated, so no configuration is produced twice.
+#
+#   random    each sample assumes a random polarity for a random subset
+#             of the options, halving the subset on conflicts, so
+#             successive samples spread out over the space
+#   xor       each sample adds random parity (xor) constraints over the
+#             options to cut the space into random cells and takes a
+#             solution from one cell, which is closer to uniform.  the
+#             number of constraints adapts to keep the cells nonempty.
+#   twise     greedy t-wise coverage: each sample covers as many not yet
+#             covered combinations of t option settings as possible
+
+strategies = [ "random", "xor", "twise" ]
+
+class SamplingError(Exception):
+  pass
+
+class Sampler:
+  def __init__(self, constraints, sample_names=None, coverage_names=None, strategy="random", random_seed=None, t=2, max_checks=100, worker_i=0, jobs=1):
+    """constraints are the hard constraints.  sample_names is the set of
+    option names that distinguish samples, e.g., the visible options,
+    or None for all options.  coverage_names are the options to cover
+    for the twise strategy.  worker_i is this sampler's worker out of
+    jobs parallel ones, which all get the same random_seed."""
+    self.solver = z3.Solver()
+    for constraint in constraints:
+      self.solver.add(constraint)
+    self.sample_names = sample_names
+    self.strategy = strategy
+    # worker i of n uses the solver seeds congruent to i modulo n, so
+    # no two workers share one
+    self.random = random.Random(random_seed * jobs + worker_i if random_seed is not None else None)
+    self.seed = (random_seed if random_seed is not None else 0) * jobs + worker_i
+    self.seed_stride = jobs
+    self.t = t
+    self.max_checks = max_checks
+    self.sample_vars = None
+    self.num_samples = 0
+    self.num_xors = 1
+    self.random_size = len(sample_names) if sample_names is not None else 1024
+    self.exhausted = False
+    if strategy == "twise":
+      self.coverage_vars = [ z3.Bool(name) for name in sorted(coverage_names) ]
+      self.uncovered = set()
+      for combination in itertools.combinations(range(len(self.coverage_vars)), t):
+        for polarities in itertools.product([ True, False ], repeat=t):
+          self.uncovered.add(tuple(zip(combination, polarities)))
+
+  def get_sample_vars(self, model):
+    if self.sample_names is not None:
+      return [ z3.Bool(name) for name in sorted(self.sample_names) ]
+    else:
+      return [ decl() for decl in model.decls() if decl.arity() == 0 and z3.is_bool(decl()) ]
+
+  def block(self, model):
+    """Prevent the same settings of the sample options from being
+    generated again."""
+    differences = [ var != model.eval(var, model_completion=True) for var in self.sample_vars ]
+    if len(differences) == 0:
+      self.exhausted = True
+    else:
+      self.solver.add(z3.Or(differences))
+
+  def check(self, assumptions=[]):
+    self.solver.set(random_seed=self.seed + self.seed_stride * self.num_samples)
+    return self.solver.check(assumptions)
+
+  def next(self):
+    """Generate the next distinct sample, or return None when no new
+    sample is possible."""
+    if self.exhausted:
+      return None
+    if self.sample_vars is None:
+      # the first sample fixes which options to vary
+      if self.check() != z3.sat:
+        self.exhausted = True
+        return None
+      self.sample_vars = self.get_sample_vars(self.solver.model())
+    if self.strategy == "xor":
+      model = self.next_xor()
+    elif self.strategy == "twise":
+      model = self.next_twise()
+    else:
+      model = self.next_random()
+    if model is None:
+      self.exhausted = True
+      return None
+    self.num_samples += 1
+    self.block(model)
+    return model
+
+  def random_literals(self, variables, size):
+    return [ var if self.random.random() < 0.5 else z3.Not(var) for var in self.random.sample(variables, min(size, len(variables))) ]
+
+  def next_random(self):
+    # start from twice the number of literals that worked last time
+    size = min(len(self.sample_vars), max(1, self.random_size * 2))
+    while True:
+      res = self.check(self.random_literals(self.sample_vars, size))
+      if res == z3.sat:
+        self.random_size = size
+        return self.solver.model()
+      elif size == 0:
+        return None
+      size = size / 2
+
+  def xor_constraint(self):
+    # a random subset of the options with a random parity
+    operands = [ var for var in self.sample_vars if self.random.random() < 0.5 ]
+    if self.random.random() < 0.5:
+      operands.append(z3.BoolVal(True))
+    if len(operands) == 0:
+      return z3.BoolVal(False)
+    # balanced tree, since a chain of thousands of xors is too deep
+    while len(operands) > 1:
+      operands = [ z3.Xor(operands[i], operands[i + 1]) if i + 1 < len(operands) else operands[i]
+                   for i in range(0, len(operands), 2) ]
+    return operands[0]
+
+  def next_xor(self):
+    while True:
+      self.solver.push()
+      for i in range(self.num_xors):
+        self.solver.add(self.xor_constraint())
+      res = self.check()
+      model = self.solver.model() if res == z3.sat else None
+      self.solver.pop()
+      if model is not None:
+        # the cell had a solution, so try smaller cells next time
+        if self.num_xors < len(self.sample_vars):
+          self.num_xors += 1
+        return model
+      elif self.num_xors == 0:
+        return None
+      self.num_xors -= 1
+
+  def covered(self, model, combination):
+    for index, polarity in combination:
+      if z3.is_true(model.eval(self.coverage_vars[index], model_completion=True)) != polarity:
+        return False
+    return True
+
+  def literals(self, combination):
+    return [ self.coverage_vars[index] if polarity else z3.Not(self.coverage_vars[index]) for index, polarity in combination ]
+
+  def next_twise(self):
+    if len(self.uncovered) == 0:
+      return None
+    assumptions = []
+    combinations = list(self.uncovered)
+    self.random.shuffle(combinations)
+    model = None
+    checks = 0
+    for combination in combinations:
+      if model is not None and self.covered(model, combination):
+        continue
+      if checks == self.max_checks and model is not None:
+        break
+      checks += 1
+      res = self.check(assumptions + self.literals(combination))
+      if res == z3.sat:
+        assumptions.extend(self.literals(combination))
+        model = self.solver.model()
+      elif len(assumptions) == 0:
+        # this combination is impossible (or all samples covering it
+        # have already been generated)
+        self.uncovered.discard(combination)
+    if model is None:
+      return None
+    self.uncovered = set([ combination for combination in self.uncovered if not self.covered(model, combination) ])
+    return model
+
+def sample_worker(queue, stop, make_sampler, render):
+  try:
+    sampler = make_sampler()
+    while not stop.is_set():
+      model = sampler.next()
+      if model is None:
+        break
+      queue.put(render(model))
+  except Exception:
+    # the parent raises the worker's traceback
+    queue.put(SamplingError(traceback.format_exc()))
+  finally:
+    queue.put(None)
+
+def parallel_samples(make_sampler, render, jobs):
+  """Generate samples in jobs worker processes, yielding the distinct
+  rendered samples as soon as they arrive.  make_sampler(worker_i)
+  creates a worker's Sampler after the fork, so each worker loads its
+  own solver, and render(model) turns a model into the sample's text,
+  which is also what samples are deduplicated by, since each worker
+  only blocks its own samples.  The workers are stopped when the
+  caller stops iterating or all of them are exhausted.  A
+  SamplingError with the traceback is raised if a worker fails."""
+  queue = multiprocessing.Queue()
+  stop = multiprocessing.Event()
+  workers = [ multiprocessing.Process(target=sample_worker, args=(queue, stop, lambda worker_i=worker_i: make_sampler(worker_i), render))
+              for worker_i in range(jobs) ]
+  for worker in workers:
+    worker.daemon = True
+    worker.start()
+  seen = set()
+  running = len(workers)
+  try:
+    while running > 0:
+      text = queue.get()
+      if text is None:
+        running -= 1
+      elif isinstance(text, SamplingError):
+        raise text
+      elif text not in seen:
+        seen.add(text)
+        yield text
+  finally:
+    stop.set()
+    for worker in workers:
+      # a worker may be in the middle of a long check
+      worker.terminate()
+      worker.join()
@@ -4,3 +4,13 @@ do_recursive = False
 do_boolean_configs = False
 unit_pc_format = False
 defines = None
+parse_cache_dir = None
+parse_jobs = 1
+source_index_file = None
+source_index_check = True
+include_cache_file = None
+do_slicing = True
+do_token_lists = True
+max_multiverse = None
+max_bdd_nodes = None
+directory_timeout = None
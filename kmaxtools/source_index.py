@@ -0,0 +1,306 @@
+import os
+import stat
+import hashlib
+import subprocess
+import cPickle as pickle
+from multiprocessing.pool import ThreadPool
+
+import kmaxtools.settings
+from kmaxtools import atomic_file
+
+# an index of the files in the source tree, i.e., the current
+# directory, so that kmax's existence checks on units' .c and .S files
+# and subdirectories, and the listings of .c files done by kmaxall and
+# FileAnalysis, are dictionary lookups instead of one stat or glob each.
+#
+# the index is built with git ls-files in a git work tree, and with a
+# parallel walk of the directories otherwise.  it is saved with a stamp
+# and rebuilt when the stamp no longer matches: in a git work tree, when
+# HEAD, the git index, or the untracked or deleted files change, and
+# otherwise when the mtime of any directory changes, since adding or
+# removing a file changes the mtime of its directory.  only the changed
+# directories are listed again.
+#
+# the index is only used when kmaxtools.settings.source_index_file is
+# set, e.g., by kmax --source-index.  otherwise the functions below
+# fall back to the filesystem.
+
+# change this when the index's data structures change
+version = "1"
+
+walk_threads = 16
+
+class SourceIndex:
+    def __init__(self, root, stamp, dirs, dir_mtimes=None):
+        """dirs maps each directory, relative to root and normalized,
+        with "." for root, to the set of the names of its files"""
+        self.root = root
+        self.stamp = stamp
+        self.dirs = dirs
+        self.dir_mtimes = dir_mtimes
+
+    def relpath(self, path):
+        """normalize a path relative to the root, or return None if it is
+        outside of the source tree"""
+        if os.path.isabs(path):
+            if not path.startswith(self.root + os.sep):
+                return None
+            path = os.path.relpath(path, self.root)
+        path = os.path.normpath(path)
+        if path.startswith(".." + os.sep) or path == "..":
+            return None
+        return path
+
+    def isfile(self, path):
+        relpath = self.relpath(path)
+        if relpath is None:
+            return os.path.isfile(path)
+        dirname, name = os.path.split(relpath)
+        files = self.dirs.get(dirname if dirname != "" else ".")
+        return files is not None and name in files
+
+    def isdir(self, path):
+        relpath = self.relpath(path)
+        if relpath is None:
+            return os.path.isdir(path)
+        return relpath in self.dirs
+
+    def listfiles(self, path, suffix=""):
+        """list the files directly in a directory that end in suffix, as
+        normalized paths"""
+        relpath = self.relpath(path)
+        if relpath is None:
+            return listfiles_from_disk(path, suffix)
+        files = self.dirs.get(relpath, ())
+        return [ os.path.normpath(os.path.join(path, name)) for name in files if name.endswith(suffix) ]
+
+    def walkfiles(self, path, suffix=""):
+        """list the files anywhere under a directory that end in suffix,
+        as normalized paths"""
+        relpath = self.relpath(path)
+        if relpath is None:
+            return [ os.path.normpath(os.path.join(dirpath, name))
+                     for dirpath, dirnames, filenames in os.walk(path)
+                     for name in filenames if name.endswith(suffix) ]
+        files = []
+        for dirname, names in self.dirs.iteritems():
+            if is_under(dirname, relpath):
+                subdir = os.path.join(path, os.path.relpath(dirname, relpath))
+                files.extend([ os.path.normpath(os.path.join(subdir, name)) for name in names if name.endswith(suffix) ])
+        return files
+
+def is_under(path, dirname):
+    """whether a normalized relative path is dirname or under it"""
+    return dirname == "." or path == dirname or path.startswith(dirname + os.sep)
+
+def listfiles_from_disk(path, suffix):
+    if not os.path.isdir(path):
+        return []
+    return [ os.path.normpath(os.path.join(path, name)) for name in os.listdir(path)
+             if name.endswith(suffix) and os.path.isfile(os.path.join(path, name)) ]
+
+def git(args):
+    p = subprocess.Popen([ "git" ] + args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    out, err = p.communicate()
+    if p.returncode != 0:
+        return None
+    return out
+
+def get_git_stamp():
+    """get HEAD, the mtime of the git index, and a hash of the untracked
+    and deleted files, or None if the current directory is not the top
+    of a git work tree"""
+    toplevel = git([ "rev-parse", "--show-toplevel" ])
+    if toplevel is None or os.path.realpath(toplevel.strip()) != os.path.realpath(os.getcwd()):
+        return None
+    head = git([ "rev-parse", "HEAD" ])
+    git_index = git([ "rev-parse", "--git-path", "index" ])
+    if head is None or git_index is None or not os.path.exists(git_index.strip()):
+        return None
+    # the files in the work tree but not in the git index, and the other
+    # way around, which neither HEAD nor the git index record
+    changes = git([ "ls-files", "-z", "--others", "--deleted" ])
+    if changes is None:
+        return None
+    return ("git", head.strip(), os.path.getmtime(git_index.strip()), hashlib.sha1(changes).hexdigest())
+
+def build_git_index(stamp):
+    # tracked and untracked files, so that build outputs in the tree are
+    # found like on disk, but not tracked files that were deleted
+    files = git([ "ls-files", "-z", "--cached", "--others" ])
+    deleted = git([ "ls-files", "-z", "--deleted" ])
+    if files is None or deleted is None:
+        return None
+    deleted = set(deleted.split("\0"))
+    dirs = { ".": set() }
+    for path in files.split("\0"):
+        if path == "" or path in deleted:
+            continue
+        dirname, name = os.path.split(path)
+        dirname = dirname if dirname != "" else "."
+        if dirname not in dirs:
+            # add the ancestors, since git only lists files
+            ancestor = dirname
+            while ancestor != "" and ancestor not in dirs:
+                dirs[ancestor] = set()
+                ancestor = os.path.dirname(ancestor)
+        dirs[dirname].add(name)
+    return SourceIndex(os.getcwd(), stamp, dirs)
+
+def list_directory(path):
+    """list one directory, returning its mtime, file names, and
+    subdirectories, not following symlinks to directories like
+    os.walk"""
+    try:
+        mtime = os.lstat(path).st_mtime
+        names = os.listdir(path)
+    except OSError:
+        return path, None, set(), []
+    files = set()
+    subdirs = []
+    for name in names:
+        try:
+            mode = os.lstat(os.path.join(path, name)).st_mode
+        except OSError:
+            continue
+        if stat.S_ISDIR(mode):
+            if name != ".git":
+                subdirs.append(os.path.normpath(os.path.join(path, name)))
+        elif stat.S_ISLNK(mode):
+            # os.path.isfile follows the link
+            if os.path.isfile(os.path.join(path, name)):
+                files.add(name)
+        else:
+            files.add(name)
+    return path, mtime, files, subdirs
+
+def walk(pool, paths, dirs, dir_mtimes):
+    """list the given directories and everything under them in parallel,
+    one level at a time"""
+    while len(paths) > 0:
+        next_paths = []
+        for path, mtime, files, subdirs in pool.imap_unordered(list_directory, paths):
+            if mtime is None:
+                continue
+            dirs[path] = files
+            dir_mtimes[path] = mtime
+            next_paths.extend(subdirs)
+        paths = next_paths
+
+def build_walk_index():
+    dirs = {}
+    dir_mtimes = {}
+    pool = ThreadPool(walk_threads)
+    try:
+        walk(pool, [ "." ], dirs, dir_mtimes)
+    finally:
+        pool.close()
+        pool.join()
+    return SourceIndex(os.getcwd(), ("walk",), dirs, dir_mtimes)
+
+def update_walk_index(index):
+    """list again the directories whose mtimes changed, and any new
+    subdirectories under them, returning whether anything changed"""
+    pool = ThreadPool(walk_threads)
+    try:
+        mtimes = pool.map(get_mtime, index.dir_mtimes.keys())
+        changed = [ path for path, mtime in mtimes if mtime != index.dir_mtimes[path] ]
+        if len(changed) == 0:
+            return False
+        # relist the topmost changed directories and everything under
+        # them, forgetting the old subtrees, since subdirectories may be
+        # gone
+        roots = [ path for path in changed
+                  if not any(other != path and is_under(path, other) for other in changed) ]
+        for root in roots:
+            for dirname in [ dirname for dirname in index.dirs if is_under(dirname, root) ]:
+                del index.dirs[dirname]
+                del index.dir_mtimes[dirname]
+        walk(pool, roots, index.dirs, index.dir_mtimes)
+    finally:
+        pool.close()
+        pool.join()
+    return True
+
+def get_mtime(path):
+    try:
+        return path, os.lstat(path).st_mtime
+    except OSError:
+        return path, None
+
+def load_index(index_file):
+    try:
+        with open(index_file, 'rb') as fp:
+            saved_version, index = pickle.load(fp)
+    except (IOError, EOFError, pickle.UnpicklingError, ValueError):
+        return None
+    if saved_version != version or index.root != os.getcwd():
+        return None
+    return index
+
+def write_index(index_file, index):
+    atomic_file.write_cache_file(index_file, lambda fp: pickle.dump((version, index), fp, pickle.HIGHEST_PROTOCOL))
+
+def get_source_index(index_file, check=True):
+    """
+    load the source index saved in index_file, building or updating it
+    if it is missing or stale.  with check=False, a saved index is used
+    without checking its stamp, e.g., in the kmax processes started by
+    kmaxall after it has checked the index itself.
+    """
+    index = load_index(index_file)
+    if index is not None and not check:
+        return index
+    git_stamp = get_git_stamp()
+    if index is not None:
+        if git_stamp is not None and index.stamp == git_stamp:
+            return index
+        if git_stamp is None and index.stamp == ("walk",):
+            if update_walk_index(index):
+                write_index(index_file, index)
+            return index
+    index = None
+    if git_stamp is not None:
+        index = build_git_index(git_stamp)
+    if index is None:
+        index = build_walk_index()
+    write_index(index_file, index)
+    return index
+
+# the index for this process, loaded on first use
+current_index = None
+
+def get_current_index():
+    global current_index
+    if kmaxtools.settings.source_index_file is None:
+        return None
+    if current_index is None:
+        current_index = get_source_index(kmaxtools.settings.source_index_file,
+                                         kmaxtools.settings.source_index_check)
+    return current_index
+
+def isfile(path):
+    index = get_current_index()
+    if index is None:
+        return os.path.isfile(path)
+    return index.isfile(path)
+
+def isdir(path):
+    index = get_current_index()
+    if index is None:
+        return os.path.isdir(path)
+    return index.isdir(path)
+
+def listfiles(path, suffix=""):
+    index = get_current_index()
+    if index is None:
+        return listfiles_from_disk(path, suffix)
+    return index.listfiles(path, suffix)
+
+def walkfiles(path, suffix=""):
+    index = get_current_index()
+    if index is None:
+        return [ os.path.normpath(os.path.join(dirpath, name))
+                 for dirpath, dirnames, filenames in os.walk(path)
+                 for name in filenames if name.endswith(suffix) ]
+    return index.walkfiles(path, suffix)
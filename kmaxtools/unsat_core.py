@@ -0,0 +1,131 @@
+import os
+import cPickle as pickle
+import z3
+
+from kmaxtools import atomic_file
+
+# explains unsatisfiable klocalizer queries in terms of named groups of
+# constraints, e.g., "kmax:drivers/block/", "arch:x86_64", or
+# "define:CONFIG_A".  the kclause formulas are asserted once and only
+# the few labeled groups are tracked with assumption literals, which is
+# much faster than passing every kclause clause as an assumption.  the
+# cores are minimized by deletion over the labeled groups, and only
+# when an explanation is requested are the kclause options involved
+# found, by tracking them per option against the minimal core.
+#
+# conflicts are cached on disk, keyed by the labeled constraints in the
+# core, so a later query containing the same constraints against the
+# same kclause formulas is known to be unsatisfiable without solving.
+
+def get_group_key(constraints):
+  return "\n".join([ constraint.sexpr() for constraint in constraints ])
+
+class LabeledSolver:
+  def __init__(self, hard_constraints, random_seed=None):
+    self.solver = z3.Solver()
+    self.solver.set(unsat_core=True)
+    if random_seed is not None:
+      self.solver.set(random_seed=random_seed)
+    for constraint in hard_constraints:
+      self.solver.add(constraint)
+    self.labels = []
+    self.groups = {}
+    self.literals = {}
+    self.literal_labels = {}
+
+  def add(self, label, constraints):
+    """Add constraints under a label.  Adding to an existing label
+    extends its group."""
+    if label not in self.groups:
+      literal = z3.Bool("klocalizer_label!%d" % (len(self.labels)))
+      self.labels.append(label)
+      self.groups[label] = []
+      self.literals[label] = literal
+      self.literal_labels[literal.get_id()] = label
+    self.groups[label].extend(constraints)
+    for constraint in constraints:
+      self.solver.add(z3.Implies(self.literals[label], constraint))
+
+  def check(self, labels=None):
+    if labels is None:
+      labels = self.labels
+    return self.solver.check([ self.literals[label] for label in labels ])
+
+  def model(self):
+    return self.solver.model()
+
+  def get_core_labels(self):
+    return [ self.literal_labels[literal.get_id()] for literal in self.solver.unsat_core() ]
+
+  def get_minimal_core(self):
+    """After an unsat check, shrink the core until removing any label
+    makes the rest satisfiable."""
+    core = self.get_core_labels()
+    i = 0
+    while i < len(core):
+      candidate = core[:i] + core[i + 1:]
+      if self.check(candidate) == z3.unsat:
+        # the new core may be smaller than the candidate
+        core_labels = set(self.get_core_labels())
+        core = [ label for label in candidate if label in core_labels ]
+      else:
+        i += 1
+    return core
+
+  def get_group_keys(self, labels):
+    return frozenset([ get_group_key(self.groups[label]) for label in labels ])
+
+  def find_cached_core(self, cache):
+    """Find a cached conflict whose constraints are all among the
+    current labeled constraints.  Returns its current labels and its
+    kclause options, which are None if they were never computed, or
+    None if there is no such conflict."""
+    key_labels = dict([ (get_group_key(self.groups[label]), label) for label in self.labels ])
+    for group_keys, kclause_options in cache.iteritems():
+      if group_keys.issubset(key_labels):
+        return [ key_labels[group_key] for group_key in group_keys ], kclause_options
+    return None
+
+def get_kclause_options_in_core(core_constraints, kclause_by_option):
+  """Find the kclause options whose constraints, together with the
+  given constraints, are unsatisfiable.  One assumption per option, so
+  this is only for explanations."""
+  solver = z3.Solver()
+  solver.set(unsat_core=True)
+  solver.set("core.minimize", True)
+  for constraint in core_constraints:
+    solver.add(constraint)
+  literals = {}
+  for option in sorted(kclause_by_option.keys()):
+    literal = z3.Bool("klocalizer_kclause!%s" % (option))
+    literals[literal.get_id()] = option
+    for constraint in kclause_by_option[option]:
+      solver.add(z3.Implies(literal, constraint))
+  if solver.check([ z3.Bool("klocalizer_kclause!%s" % (option)) for option in sorted(kclause_by_option.keys()) ]) != z3.unsat:
+    return []
+  return sorted([ literals[literal.get_id()] for literal in solver.unsat_core() ])
+
+def get_formulas_id(kclause_file):
+  return "%s:%d" % (os.path.abspath(kclause_file), int(os.path.getmtime(kclause_file)))
+
+def load_core_cache(cache_file, kclause_file):
+  """Load the cached conflicts for the given kclause formulas."""
+  if not os.path.exists(cache_file):
+    return {}
+  try:
+    with open(cache_file, 'rb') as fp:
+      caches = pickle.load(fp)
+  except (IOError, EOFError, pickle.UnpicklingError):
+    return {}
+  return caches.get(get_formulas_id(kclause_file), {})
+
+def save_core(cache_file, kclause_file, group_keys, kclause_options=None):
+  caches = {}
+  if os.path.exists(cache_file):
+    try:
+      with open(cache_file, 'rb') as fp:
+        caches = pickle.load(fp)
+    except (IOError, EOFError, pickle.UnpicklingError):
+      caches = {}
+  caches.setdefault(get_formulas_id(kclause_file), {})[group_keys] = kclause_options
+  atomic_file.write_cache_file(cache_file, lambda fp: pickle.dump(caches, fp, pickle.HIGHEST_PROTOCOL))
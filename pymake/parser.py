@@ -348,8 +348,10 @@ _varsettokens = (':=', '+=', '?=', '=')
 
 def _parsefile(pathname):
     fd = open(pathname, "rU")
-    stmts = parsestring(fd.read(), pathname)
+    s = fd.read()
+    stmts = parsestring(s, pathname)
     stmts.mtime = os.fstat(fd.fileno()).st_mtime
+    stmts.sourcesize = len(s)
     fd.close()
     return stmts
 
@@ -361,7 +363,11 @@ def _checktime(path, stmts):
 
     return True
 
-_parsecache = util.MostUsedCache(50, _parsefile, _checktime)
+def _parsedsize(path, stmts):
+    # parsed statements take roughly ten times the space of their source
+    return len(path) + 10 * stmts.sourcesize
+
+_parsecache = util.LRUCache(64 << 20, _parsefile, _checktime, _parsedsize)
 
 def parsefile(pathname):
     """
@@ -662,6 +668,39 @@ _matchingbrace = {
     '{': '}',
     }
 
+# Most values in Kbuild makefiles are plain word lists and simple
+# variable references like $(obj-y) or $(CONFIG_X).  When the rest of
+# the data has no other tokens, comments, or escaped newlines, it is
+# parsed with two regular expressions instead of the tokenizer and the
+# parse stack.  Everything else, e.g., a function call, goes through the
+# general parser below.
+_simplesyntax = re.compile(r'(?:[^$#:=(){};,|\'"\n]+|\$\([\w.-]+\)|\$\{[\w.-]+\})*')
+_simplevarref = re.compile(r'\$(?:\(([\w.-]+)\)|\{([\w.-]+)\})')
+
+def _parsesimplesyntax(d, offset):
+    """
+    Parse data matching _simplesyntax into the same data.Expansion that
+    parsemakesyntax would produce.
+    """
+    s = d.s
+    loc = d.getloc(d.lstart)
+    if s.find('$', offset, d.lend) == -1:
+        return data.StringExpansion(s[offset:d.lend], loc)
+
+    # literal strings are never adjacent here, so the elements are
+    # already what Expansion.finish would merge them into
+    e = data.Expansion(loc=loc)
+    for m in _simplevarref.finditer(s, offset, d.lend):
+        mstart, mend = m.span(0)
+        if mstart > offset:
+            e.append((s[offset:mstart], False))
+        vname = data.StringExpansion(m.group(1) or m.group(2), None)
+        e.append((functions.VariableRef(d.getloc(mstart), vname), True))
+        offset = mend
+    if offset < d.lend:
+        e.append((s[offset:d.lend], False))
+    return e
+
 def parsemakesyntax(d, offset, stopon, iterfunc):
     """
     Given Data, parse it into a data.Expansion.
@@ -681,6 +720,11 @@ def parsemakesyntax(d, offset, stopon, iterfunc):
 
     assert callable(iterfunc)
 
+    if iterfunc in (iterdata, itermakefilechars, itercommandchars):
+        m = _simplesyntax.match(d.s, offset, d.lend)
+        if m.end() == d.lend:
+            return _parsesimplesyntax(d, offset), None, None
+
     stacktop = ParseStackFrame(_PARSESTATE_TOPLEVEL, None, data.Expansion(loc=d.getloc(d.lstart)),
                                tokenlist=stopon + ('$',),
                                openbrace=None, closebrace=None)
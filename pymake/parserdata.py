@@ -973,7 +973,7 @@ class StatementList(list):
     Consumers can iterate over all Statement instances in this collection to
     statically inspect (and even modify) make files before they are executed.
     """
-    __slots__ = ('mtime',)
+    __slots__ = ('mtime', 'sourcesize')
 
     def append(self, statement):
         assert isinstance(statement, Statement)
@@ -1,4 +1,5 @@
-import os
+import os, sys
+from collections import OrderedDict
 
 class MakeError(Exception):
     def __init__(self, message, loc=None):
@@ -90,61 +91,100 @@ except ImportError:
                 return True
         return False
 
-class _MostUsedItem(object):
-    __slots__ = ('key', 'o', 'count')
-
-    def __init__(self, key):
-        self.key = key
-        self.o = None
-        self.count = 1
+def estimatesize(key, value):
+    """
+    Estimate the bytes used by a cache entry.  Strings count their length;
+    other values count only their own object, not what they refer to, so
+    callers caching large structures should pass a sizefunc.
+    """
+    if isinstance(value, basestring):
+        return len(key) + len(value)
+    return len(key) + sys.getsizeof(value)
 
-    def __repr__(self):
-        return "MostUsedItem(key=%r, count=%i, o=%r)" % (self.key, self.count, self.o)
+class LRUCache(object):
+    """
+    A least-recently-used cache with O(1) lookups and insertions, bounded by
+    an estimated size in bytes.  Only cached entries are tracked, so the
+    metadata stays bounded too.
+
+    If creationfunc is given, get(key) creates missing values with
+    creationfunc(key).  If verifyfunc is given, a cached value is only used
+    when verifyfunc(key, value) is true.  sizefunc(key, value) estimates the
+    bytes of an entry and defaults to estimatesize.
+    """
 
-class MostUsedCache(object):
-    def __init__(self, capacity, creationfunc, verifyfunc):
-        self.capacity = capacity
+    def __init__(self, maxbytes, creationfunc=None, verifyfunc=None, sizefunc=None):
+        self.maxbytes = maxbytes
         self.cfunc = creationfunc
         self.vfunc = verifyfunc
-
-        self.d = {}
-        self.active = [] # lazily sorted!
-
-    def setactive(self, item):
-        if item in self.active:
+        self.sfunc = sizefunc or estimatesize
+
+        # key -> (value, size), from least to most recently used
+        self.d = OrderedDict()
+        self.bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.d)
+
+    def __contains__(self, key):
+        return key in self.d
+
+    def lookup(self, key, default=None):
+        """
+        Return the cached value for key, or default if it is not cached.
+        """
+        entry = self.d.pop(key, None)
+        if entry is None:
+            self.misses += 1
+            return default
+
+        if self.vfunc is not None and not self.vfunc(key, entry[0]):
+            self.bytes -= entry[1]
+            self.misses += 1
+            return default
+
+        # reinserting makes it the most recently used
+        self.d[key] = entry
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key, value):
+        old = self.d.pop(key, None)
+        if old is not None:
+            self.bytes -= old[1]
+
+        size = self.sfunc(key, value)
+        if size > self.maxbytes:
+            # would evict everything else and still not fit
             return
 
-        if len(self.active) == self.capacity:
-            self.active.sort(key=lambda i: i.count)
-            old = self.active.pop(0)
-            old.o = None
-            # print "Evicting %s" % old.key
-
-        self.active.append(item)
+        self.d[key] = (value, size)
+        self.bytes += size
+        while self.bytes > self.maxbytes:
+            oldkey, (oldvalue, oldsize) = self.d.popitem(last=False)
+            self.bytes -= oldsize
+            self.evictions += 1
 
     def get(self, key):
-        item = self.d.get(key, None)
-        if item is None:
-            item = _MostUsedItem(key)
-            self.d[key] = item
-        else:
-            item.count += 1
-
-        if item.o is not None and self.vfunc(key, item.o):
-            return item.o
-
-        item.o = self.cfunc(key)
-        self.setactive(item)
-        return item.o
-
-    def verify(self):
-        for k, v in self.d.iteritems():
-            if v.o:
-                assert v in self.active
-            else:
-                assert v not in self.active
-
-    def debugitems(self):
-        l = [i.key for i in self.active]
-        l.sort()
-        return l
+        """
+        Return the cached value for key, creating it with creationfunc if it
+        is missing or no longer valid.
+        """
+        value = self.lookup(key, _missing)
+        if value is _missing:
+            value = self.cfunc(key)
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        self.d.clear()
+        self.bytes = 0
+
+    def stats(self):
+        return "%d entries, %d bytes, %d hits, %d misses, %d evictions" % (len(self.d), self.bytes, self.hits, self.misses, self.evictions)
+
+_missing = object()
@@ -21,4 +21,4 @@ echo "Linux ${version}" >> .kmax/info.txt
 date >> .kmax/info.txt
 /usr/bin/time bash ${scripts_dir}/kmaxlinux.sh |& tee kmaxlinux.out
 /usr/bin/time bash ${scripts_dir}/kclauselinux.sh |& tee kclauselinux.out
-tar -jcvf "kmax-formulas_linux-${version}.tar.bz2" .kmax/
+tar -jcvf "kmax-formulas_linux-${version}.tar.bz2" --exclude=.kmax/parse_cache --exclude=.kmax/source_index .kmax/
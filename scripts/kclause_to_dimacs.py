@@ -1,5 +1,11 @@
+import sys
 import pickle
 import z3
+from kmaxtools import dimacs
+
+# converts an existing kclause pickle to dimacs.  kclause --dimacs
+# produces the same cnf directly from the kconfig_extract file and also
+# emits the variable type comments, so prefer that when regenerating.
 
 def get_kclause_constraints(kclause_file):
   with open(kclause_file, 'r') as fp:
@@ -11,24 +17,22 @@ def get_kclause_constraints(kclause_file):
       kclause_constraints[var] = [ z3.parse_smt2_string(clause) for clause in kclause[var] ]
 
     constraints = []
-    for var in kclause_constraints.keys():
+    for var in sorted(kclause_constraints.keys()):
       for z3_clause in kclause_constraints[var]:
         constraints.extend(z3_clause)
 
     return constraints
 
-constraints = get_kclause_constraints(".kmax/kclause/x86_64/kclause")
-
-solver = z3.Solver()
+if len(sys.argv) > 1:
+  kclause_file = sys.argv[1]
+else:
+  kclause_file = ".kmax/kclause/x86_64/kclause"
 
-use_tseitin = True
+constraints = get_kclause_constraints(kclause_file)
 
-if use_tseitin:
-  g = z3.Goal()
-  g.add(constraints)
-  t = z3.Tactic('tseitin-cnf')
-  solver.add(g)
-else:
-  solver.add(constraints)
+encoder = dimacs.DimacsEncoder()
+for constraint in constraints:
+  encoder.add_constraint(constraint)
 
-print(solver.dimacs())
+comments = [ "%d %s" % (encoder.varnums[varname], varname) for varname in sorted(encoder.varnums, key=encoder.varnums.get) ]
+encoder.write(sys.stdout, comments)
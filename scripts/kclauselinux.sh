@@ -19,4 +19,5 @@ for arch in x86_64 i386 arm arm64 sparc sparc64 mips ia64 powerpc alpha arc c6x
   mkdir -p .kmax/kclause/$arch
   "$script_dir/../kconfig_extractor/kconfig_extractor" --extract -e ARCH=$arch -e SRCARCH=$srcarch -e KERNELVERSION=kcu -e srctree=./ -e CC=cc Kconfig > .kmax/kclause/$arch/kconfig_extract
   /usr/bin/time kclause --remove-orphaned-nonvisible < .kmax/kclause/$arch/kconfig_extract > .kmax/kclause/$arch/kclause
+  /usr/bin/time kclause --analyze-core .kmax/kclause/$arch/kclause
 done
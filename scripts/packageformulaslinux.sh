@@ -12,4 +12,4 @@ else
   fi
 fi
 
-tar -jcvf "kmax-formulas_linux-${version}.tar.bz2" .kmax/
+tar -jcvf "kmax-formulas_linux-${version}.tar.bz2" --exclude=.kmax/parse_cache --exclude=.kmax/source_index .kmax/
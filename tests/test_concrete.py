@@ -0,0 +1,32 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from kmaxtools import concrete
+
+class TestComposites(unittest.TestCase):
+  def setUp(self):
+    self.cwd = os.getcwd()
+    self.tree = tempfile.mkdtemp()
+    os.mkdir(os.path.join(self.tree, "d"))
+    with open(os.path.join(self.tree, "d", "Makefile"), "w") as fp:
+      fp.write("obj-y += foo.o\nfoo-$(CONFIG_B) += b.o\nobj-m += bar.o\nbar-$(CONFIG_B) += c.o\n")
+    os.chdir(self.tree)
+
+  def tearDown(self):
+    os.chdir(self.cwd)
+    shutil.rmtree(self.tree)
+
+  def test_builtin_composite(self):
+    """an obj-y composite has its -y members, but not its -m ones"""
+    self.assertEqual(concrete.evaluate_unit("d/b.o", { "CONFIG_B": "y" })[-1][2], "obj-y")
+    self.assertEqual(concrete.evaluate_unit("d/b.o", { "CONFIG_B": "m" })[-1][2], None)
+
+  def test_module_composite(self):
+    """an obj-m composite has both its -y and -m members"""
+    self.assertEqual(concrete.evaluate_unit("d/c.o", { "CONFIG_B": "y" })[-1][2], "obj-m")
+    self.assertEqual(concrete.evaluate_unit("d/c.o", { "CONFIG_B": "m" })[-1][2], "obj-m")
+
+if __name__ == '__main__':
+  unittest.main()
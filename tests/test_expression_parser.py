@@ -0,0 +1,30 @@
+import unittest
+
+from kmaxtools import expression_parser
+
+class TestParse(unittest.TestCase):
+  def test_integer_comparisons(self):
+    """numbers compared with options stay as they are"""
+    for expr in [ "(CONFIG_N > 2)",
+                  "(CONFIG_A and (CONFIG_N > 2))",
+                  "(CONFIG_A or (0 < CONFIG_N) or (CONFIG_N <= 1))",
+                  "((CONFIG_N >= 0) and (CONFIG_N != 1) and (CONFIG_M == 16))",
+                  "(not (CONFIG_N == 0))" ]:
+      self.assertEqual(expression_parser.to_string(expression_parser.parse(expr)), expr)
+
+  def test_boolean_constants(self):
+    """numbers standing alone as boolean operands are constants"""
+    self.assertEqual(expression_parser.parse("(1)"), expression_parser.TRUE)
+    self.assertEqual(expression_parser.parse("0"), expression_parser.FALSE)
+    self.assertEqual(expression_parser.parse("(CONFIG_A and 2)"),
+                     ("and", (("atom", "CONFIG_A"), expression_parser.TRUE)))
+    self.assertEqual(expression_parser.make_and([ expression_parser.parse("(CONFIG_N > 2)"), expression_parser.parse("(1)") ]),
+                     ("cmp", ">", ("atom", "CONFIG_N"), ("atom", "2")))
+
+  def test_identifiers(self):
+    """numbers, strings, and hex values are not config vars"""
+    tree = expression_parser.parse("(CONFIG_A and (CONFIG_N > 2) and (CONFIG_S == \"x\") and (CONFIG_H < 0x10))")
+    self.assertEqual(sorted(expression_parser.get_identifiers(tree)), [ "CONFIG_A", "CONFIG_H", "CONFIG_N", "CONFIG_S" ])
+
+if __name__ == '__main__':
+  unittest.main()
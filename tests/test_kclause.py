@@ -0,0 +1,141 @@
+import os
+import sys
+import subprocess
+import itertools
+import cPickle as pickle
+import shutil
+import tempfile
+import unittest
+
+import z3
+
+package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+kclause_tests = os.path.join(package_dir, "tests", "kclause_tests")
+
+def run_kclause(extract, args=[], with_stderr=False):
+  """run kclause on an extract file, returning its stdout, and its
+  stderr with_stderr"""
+  env = dict(os.environ)
+  env["PYTHONPATH"] = package_dir
+  with open(os.path.join(kclause_tests, extract)) as fp:
+    p = subprocess.Popen([ sys.executable, os.path.join(package_dir, "kmaxtools", "kclause") ] + args,
+                         stdin=fp, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
+    out, err = p.communicate()
+  if p.returncode != 0:
+    raise Exception("kclause failed: %s" % (err))
+  return (out, err) if with_stderr else out
+
+def get_formula(kclause):
+  """the conjunction of every option's constraints in a kclause map"""
+  return z3.And([ z3_clause for clauses in kclause.values() for clause in clauses for z3_clause in z3.parse_smt2_string(clause) ])
+
+def equivalent(a, b):
+  solver = z3.Solver()
+  solver.add(a != b)
+  return solver.check() == z3.unsat
+
+def parse_dimacs(text):
+  comments = []
+  clauses = []
+  num_vars = None
+  for line in text.splitlines():
+    if line.startswith("c "):
+      comments.append(line[2:])
+    elif line.startswith("p cnf "):
+      num_vars = int(line.split()[2])
+    elif line.strip() != "":
+      clauses.append([ int(lit) for lit in line.split()[:-1] ])
+  return comments, num_vars, clauses
+
+def count_cnf_models(num_vars, clauses):
+  count = 0
+  for values in itertools.product([ False, True ], repeat=num_vars):
+    if all(any(values[abs(lit) - 1] == (lit > 0) for lit in clause) for clause in clauses):
+      count += 1
+  return count
+
+def count_models(formula, names):
+  solver = z3.Solver()
+  solver.add(formula)
+  variables = [ z3.Bool(name) for name in names ]
+  count = 0
+  while solver.check() == z3.sat:
+    model = solver.model()
+    count += 1
+    solver.add(z3.Or([ var != model.eval(var, model_completion=True) for var in variables ]))
+  return count
+
+class TestDimacs(unittest.TestCase):
+  def test_comments(self):
+    """every v2 variable comment has exactly the documented fields"""
+    comments, num_vars, clauses = parse_dimacs(run_kclause("predicate.extract", [ "--dimacs", "--comment-format-v2" ]))
+    self.assertEqual(comments[0], "format kmax_kconfig_v2")
+    names = []
+    for comment in comments[1:]:
+      fields = comment.split()
+      self.assertEqual(fields[0], "kconfig_variable")
+      self.assertTrue(int(fields[1]) <= num_vars)
+      if fields[3] in [ "string", "int" ]:
+        self.assertEqual(len(fields), 5, comment)
+      else:
+        self.assertEqual(len(fields), 4, comment)
+      names.append(fields[2])
+    self.assertTrue(any(name.startswith("PREDICATE_") for name in names), names)
+
+  def test_model_count(self):
+    """the tseitin encoding keeps the number of configurations"""
+    kclause = pickle.loads(run_kclause("predicate.extract"))
+    formula = get_formula(kclause)
+    names = [ str(var) for var in z3.z3util.get_vars(formula) ]
+    comments, num_vars, clauses = parse_dimacs(run_kclause("predicate.extract", [ "--dimacs" ]))
+    # the comments name the same variables, with whitespace replaced
+    self.assertEqual(sorted(comment.split()[1] for comment in comments), sorted("_".join(name.split()) for name in names))
+    self.assertEqual(count_cnf_models(num_vars, clauses), count_models(formula, names))
+
+class TestIncremental(unittest.TestCase):
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.tmpdir)
+
+  def run_incremental(self, previous_args, args):
+    previous_kclause = os.path.join(self.tmpdir, "kclause.old")
+    run_kclause("incremental_old.extract", previous_args + [ "-o", previous_kclause ])
+    return run_kclause("incremental_new.extract",
+                       args + [ "--previous-extract", os.path.join(kclause_tests, "incremental_old.extract"),
+                                "--previous-kclause", previous_kclause ],
+                       with_stderr=True)
+
+  def test_same_as_full(self):
+    """reusing the unchanged options gives the same constraints"""
+    for args in [ [], [ "--include-bool-defaults" ], [ "--remove-reverse-dependencies" ] ]:
+      full = pickle.loads(run_kclause("incremental_new.extract", args))
+      out, err = self.run_incremental(args, args)
+      incremental = pickle.loads(out)
+      self.assertIn("reusing", err)
+      self.assertEqual(sorted(full.keys()), sorted(incremental.keys()))
+      self.assertTrue(equivalent(get_formula(full), get_formula(incremental)), args)
+
+  def test_different_arguments(self):
+    """a previous run with other arguments is not reused"""
+    full = pickle.loads(run_kclause("incremental_new.extract", [ "--remove-reverse-dependencies" ]))
+    out, err = self.run_incremental([], [ "--remove-reverse-dependencies" ])
+    self.assertIn("recomputing all options", err)
+    self.assertNotIn("reusing", err)
+    self.assertTrue(equivalent(get_formula(full), get_formula(pickle.loads(out))))
+
+  def test_no_options_file(self):
+    """a previous run without a .options file is not reused"""
+    previous_kclause = os.path.join(self.tmpdir, "kclause.old")
+    with open(previous_kclause, "w") as fp:
+      fp.write(run_kclause("incremental_old.extract"))
+    out, err = run_kclause("incremental_new.extract",
+                           [ "--previous-extract", os.path.join(kclause_tests, "incremental_old.extract"),
+                             "--previous-kclause", previous_kclause ],
+                           with_stderr=True)
+    self.assertIn("recomputing all options", err)
+    self.assertNotIn("reusing", err)
+
+if __name__ == '__main__':
+  unittest.main()
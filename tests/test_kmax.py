@@ -0,0 +1,146 @@
+import os
+import unittest
+
+import z3
+
+import kmaxtools.settings
+import kmaxtools.alg
+import kmaxtools.parse_cache
+import pymake.parser
+
+kbuild_tests = os.path.join(os.path.dirname(os.path.abspath(__file__)), "kbuild_tests")
+
+def implies(a, b):
+  solver = z3.Solver()
+  solver.add(z3.And(a, z3.Not(b)))
+  return solver.check() == z3.unsat
+
+def equivalent(a, b):
+  return implies(a, b) and implies(b, a)
+
+class KmaxTestCase(unittest.TestCase):
+  def setUp(self):
+    self.saved = dict((name, value) for name, value in vars(kmaxtools.settings).items() if not name.startswith("_"))
+
+  def tearDown(self):
+    for name, value in self.saved.items():
+      setattr(kmaxtools.settings, name, value)
+
+  def run_kmax(self, test, **settings):
+    """run kmax on a kbuild test with the default settings, except for
+    boolean configs and the given ones, returning the presence
+    condition of each unit by its file name and the results"""
+    for name, value in self.saved.items():
+      setattr(kmaxtools.settings, name, value)
+    kmaxtools.settings.do_boolean_configs = True
+    for name, value in settings.items():
+      setattr(kmaxtools.settings, name, value)
+    run = kmaxtools.alg.Run()
+    run.run([ os.path.join(kbuild_tests, test) ])
+    pcs = dict((os.path.basename(unit), pc) for unit, pc in run.results.presence_conditions.items())
+    return pcs, run.results
+
+class TestSlicing(KmaxTestCase):
+  def test_skipped_stmts(self):
+    """only the flags assignments and the block around them are skipped"""
+    stmts = kmaxtools.parse_cache.parsefile(os.path.join(kbuild_tests, "slicing"))
+    skipped = kmaxtools.alg.get_skipped_stmts(stmts)
+    expected = set(id(s) for s in stmts[:4])
+    for cond, block_stmts in stmts[2]:
+      expected.update(id(s) for s in block_stmts)
+    self.assertEqual(skipped, expected)
+
+  def test_include(self):
+    """a makefile with an include is not sliced"""
+    stmts = pymake.parser.parsestring("ccflags-y := -DFOO\ninclude foo.mk\nobj-y += foo.o\n", "Makefile")
+    self.assertEqual(kmaxtools.alg.get_skipped_stmts(stmts), set())
+
+  def test_same_results(self):
+    """slicing does not change the units or their conditions"""
+    for test in [ "slicing", "paper_example", "composite", "usbcore_definition_simple", "gsoc" ]:
+      pcs, results = self.run_kmax(test)
+      unsliced_pcs, unsliced_results = self.run_kmax(test, do_slicing=False)
+      self.assertEqual(results.compilation_units, unsliced_results.compilation_units, test)
+      self.assertEqual(results.subdirs, unsliced_results.subdirs, test)
+      self.assertEqual(set(pcs), set(unsliced_pcs), test)
+      for unit in pcs:
+        self.assertTrue(equivalent(pcs[unit], unsliced_pcs[unit]), (test, unit))
+    pcs, results = self.run_kmax("slicing")
+    foo = z3.Bool("CONFIG_FOO")
+    self.assertTrue(equivalent(pcs["foo_main.o"], foo))
+    self.assertTrue(equivalent(pcs["foo_extra_64.o"], z3.And(foo, z3.Bool("CONFIG_FOO_EXTRA"), z3.Bool("CONFIG_64BIT"))))
+
+class TestTokenLists(KmaxTestCase):
+  def test_independent_appends(self):
+    """each token of a list keeps its own condition"""
+    pcs, results = self.run_kmax("token_lists")
+    foo = z3.Bool("CONFIG_FOO")
+    self.assertTrue(equivalent(pcs["foo_main.o"], foo))
+    self.assertTrue(equivalent(pcs["foo_core.o"], foo))
+    for i in range(1, 13):
+      self.assertTrue(equivalent(pcs["f%d.o" % i], z3.And(foo, z3.Bool("CONFIG_F%d" % i))))
+
+  def test_self_reference(self):
+    """a list that refers to itself keeps its unconditional tokens"""
+    pcs, results = self.run_kmax("self_ref")
+    algapi = z3.Bool("CONFIG_CRYPTO_ALGAPI2")
+    self.assertTrue(equivalent(pcs["algapi.o"], algapi))
+    self.assertTrue(equivalent(pcs["scatterwalk.o"], algapi))
+    self.assertTrue(equivalent(pcs["proc.o"], z3.And(algapi, z3.Bool("CONFIG_PROC_FS"))))
+
+  def test_redefinition(self):
+    """a later := of a list replaces its earlier tokens"""
+    pcs, results = self.run_kmax("redefinition_many")
+    mmu = z3.Bool("CONFIG_MMU")
+    self.assertTrue(equivalent(pcs["gup.o"], mmu))
+    self.assertTrue(equivalent(pcs["nommu.o"], z3.Not(mmu)))
+
+  def test_same_units(self):
+    """lists give the same units either way"""
+    for test in [ "paper_example", "composite", "append_many", "redef2.kbuild" ]:
+      pcs, results = self.run_kmax(test)
+      list_pcs, list_results = self.run_kmax(test, do_token_lists=False)
+      self.assertEqual(results.compilation_units, list_results.compilation_units, test)
+      for unit in pcs:
+        self.assertTrue(equivalent(pcs[unit], list_pcs[unit]), (test, unit))
+
+class TestWidening(KmaxTestCase):
+  tests = [ "widening", "paper_example", "redef2.kbuild", "redefinition",
+            "redefinition_many", "redef_composite.kbuild",
+            "redef_composite_expansion.kbuild", "redef_expansion.kbuild",
+            "self_ref" ]
+
+  limits = [ dict(max_multiverse=1), dict(max_bdd_nodes=1), dict(directory_timeout=0) ]
+
+  def test_over_approximates(self):
+    """every unit found without limits is found with them, under a
+    condition implied by the exact one"""
+    for test in self.tests:
+      base_pcs, base_results = self.run_kmax(test)
+      for limits in self.limits:
+        widened_pcs, widened_results = self.run_kmax(test, **limits)
+        for unit, base_pc in base_pcs.items():
+          self.assertIn(unit, widened_pcs, (test, limits, unit))
+          self.assertTrue(implies(base_pc, widened_pcs[unit]), (test, limits, unit))
+        self.assertTrue(base_results.compilation_units <= widened_results.compilation_units, (test, limits))
+
+  def test_no_empty_alternatives(self):
+    """widening leaves out undefined values, e.g., of BITS"""
+    for limits in [ dict(max_multiverse=1), dict(directory_timeout=0) ]:
+      for test in [ "widening", "paper_example" ]:
+        pcs, results = self.run_kmax(test, **limits)
+        self.assertNotIn("probe_.o", pcs, (test, limits))
+        self.assertIn("probe_32.o", pcs, (test, limits))
+
+  def test_widened_units(self):
+    """units whose condition was widened are reported"""
+    base_pcs, base_results = self.run_kmax("widening")
+    self.assertEqual(base_results.widened_units, set())
+    widened_pcs, widened_results = self.run_kmax("widening", max_multiverse=1)
+    widened_units = set(os.path.basename(unit) for unit in widened_results.widened_units)
+    for unit, base_pc in base_pcs.items():
+      if not equivalent(base_pc, widened_pcs[unit]):
+        self.assertIn(unit, widened_units)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+
+from pymake.util import LRUCache
+
+def size_of(key, value):
+  """entries' values are their sizes"""
+  return value
+
+class TestLRUCache(unittest.TestCase):
+  def test_bytes(self):
+    """the bytes are the sum of the cached entries' sizes across puts,
+    replacements, and evictions"""
+    cache = LRUCache(10, sizefunc=size_of)
+    cache.put("a", 3)
+    cache.put("b", 4)
+    self.assertEqual(cache.bytes, 7)
+    cache.put("a", 2)
+    self.assertEqual(cache.bytes, 6)
+    self.assertEqual(len(cache), 2)
+    cache.put("c", 5)
+    self.assertEqual(cache.bytes, 7)
+    self.assertEqual(sorted(cache.d.keys()), [ "a", "c" ])
+    self.assertEqual(cache.bytes, sum(size for value, size in cache.d.values()))
+
+  def test_least_recently_used(self):
+    """a lookup makes an entry the most recently used"""
+    cache = LRUCache(10, sizefunc=size_of)
+    cache.put("a", 4)
+    cache.put("b", 4)
+    self.assertEqual(cache.lookup("a"), 4)
+    cache.put("c", 4)
+    self.assertIn("a", cache)
+    self.assertNotIn("b", cache)
+    self.assertEqual(cache.evictions, 1)
+
+  def test_invalidation(self):
+    """an entry that fails verifyfunc is dropped along with its bytes"""
+    valid = set([ "a", "b" ])
+    cache = LRUCache(10, verifyfunc=lambda key, value: key in valid, sizefunc=size_of)
+    cache.put("a", 3)
+    cache.put("b", 4)
+    valid.remove("a")
+    self.assertEqual(cache.lookup("a", "missing"), "missing")
+    self.assertNotIn("a", cache)
+    self.assertEqual(cache.bytes, 4)
+    # the freed bytes can be reused without evicting b
+    cache.put("c", 6)
+    self.assertEqual(cache.bytes, 10)
+    self.assertEqual(cache.evictions, 0)
+
+  def test_oversize(self):
+    """an entry bigger than the cache is not cached and evicts nothing,
+    but it still replaces an older value for the same key"""
+    cache = LRUCache(10, sizefunc=size_of)
+    cache.put("a", 3)
+    cache.put("b", 11)
+    self.assertNotIn("b", cache)
+    self.assertEqual(cache.bytes, 3)
+    cache.put("a", 11)
+    self.assertNotIn("a", cache)
+    self.assertEqual(cache.bytes, 0)
+    self.assertEqual(cache.evictions, 0)
+
+  def test_counters(self):
+    """get counts hits and misses and creates missing values"""
+    created = []
+    def create(key):
+      created.append(key)
+      return len(key)
+    cache = LRUCache(4, creationfunc=create, sizefunc=size_of)
+    self.assertEqual(cache.get("ab"), 2)
+    self.assertEqual(cache.get("ab"), 2)
+    self.assertEqual(cache.get("cde"), 3)
+    self.assertEqual(cache.get("ab"), 2)
+    self.assertEqual(created, [ "ab", "cde", "ab" ])
+    self.assertEqual((cache.hits, cache.misses, cache.evictions), (1, 3, 2))
+    self.assertEqual(cache.stats(), "1 entries, 2 bytes, 1 hits, 3 misses, 2 evictions")
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,45 @@
+import unittest
+
+import z3
+
+from kmaxtools import sampling
+
+class FailingSampler:
+  """yields `count` models, then raises"""
+  def __init__(self, count):
+    self.count = count
+
+  def next(self):
+    if self.count == 0:
+      raise ValueError("solver exploded")
+    self.count -= 1
+    return self.count
+
+class TestParallelSamples(unittest.TestCase):
+  def test_distinct_samples(self):
+    """parallel workers together produce each configuration once"""
+    a, b = z3.Bools("CONFIG_A CONFIG_B")
+    def make_sampler(worker_i):
+      return sampling.Sampler([ z3.Or(a, b) ], random_seed=1, worker_i=worker_i, jobs=2)
+    def render(model):
+      return " ".join(sorted(str(var) for var in (a, b) if z3.is_true(model.eval(var, model_completion=True))))
+    samples = list(sampling.parallel_samples(make_sampler, render, 2))
+    self.assertEqual(sorted(samples), [ "CONFIG_A", "CONFIG_A CONFIG_B", "CONFIG_B" ])
+
+  def test_failing_worker(self):
+    """a worker's exception is raised in the parent with its traceback"""
+    samples = sampling.parallel_samples(lambda worker_i: FailingSampler(worker_i), str, 2)
+    with self.assertRaises(sampling.SamplingError) as raised:
+      list(samples)
+    self.assertIn("ValueError: solver exploded", str(raised.exception))
+
+  def test_failing_sampler_creation(self):
+    """a worker that fails before sampling still ends the iteration"""
+    def make_sampler(worker_i):
+      raise RuntimeError("cannot load the formulas")
+    with self.assertRaises(sampling.SamplingError) as raised:
+      list(sampling.parallel_samples(make_sampler, str, 3))
+    self.assertIn("cannot load the formulas", str(raised.exception))
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,130 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+from kmaxtools import source_index
+
+class SourceIndexTestCase(unittest.TestCase):
+  def setUp(self):
+    self.cwd = os.getcwd()
+    self.tree = tempfile.mkdtemp()
+    self.cache = tempfile.mkdtemp()
+    self.index_file = os.path.join(self.cache, "source_index")
+    os.chdir(self.tree)
+    for path in [ "Makefile", "a.c", "d/b.c", "d/b.h", "d/sub/c.c", "e/f.S" ]:
+      self.touch(path)
+
+  def tearDown(self):
+    os.chdir(self.cwd)
+    shutil.rmtree(self.tree)
+    shutil.rmtree(self.cache)
+
+  def touch(self, path):
+    if os.path.dirname(path) != "" and not os.path.isdir(os.path.dirname(path)):
+      os.makedirs(os.path.dirname(path))
+    with open(path, "w") as fp:
+      fp.write("")
+
+  def get_index(self):
+    return source_index.get_source_index(self.index_file)
+
+  def assertAgrees(self, index):
+    """the index answers like the filesystem"""
+    disk_files = []
+    for dirpath, dirnames, filenames in os.walk("."):
+      if ".git" in dirnames:
+        dirnames.remove(".git")
+      self.assertTrue(index.isdir(dirpath), dirpath)
+      for name in filenames:
+        self.assertTrue(index.isfile(os.path.join(dirpath, name)), name)
+        disk_files.append(os.path.normpath(os.path.join(dirpath, name)))
+      self.assertEqual(sorted(index.listfiles(dirpath, ".c")), sorted(source_index.listfiles_from_disk(dirpath, ".c")))
+      self.assertFalse(index.isfile(os.path.join(dirpath, "missing.c")))
+      self.assertFalse(index.isdir(os.path.join(dirpath, "missing")))
+    self.assertEqual(sorted(index.walkfiles(".")), sorted(disk_files))
+    self.assertEqual(sorted(index.walkfiles("d", ".c")), sorted(path for path in disk_files if path.startswith("d/") and path.endswith(".c")))
+    self.assertTrue(index.isfile(os.path.join(self.tree, "Makefile")))
+    self.assertFalse(index.isdir("Makefile"))
+
+class TestWalkIndex(SourceIndexTestCase):
+  def setUp(self):
+    SourceIndexTestCase.setUp(self)
+    # age the directories, so that any change gives them a new mtime
+    for dirpath, dirnames, filenames in os.walk("."):
+      os.utime(dirpath, (0, 0))
+    self.assertEqual(self.get_index().stamp, ("walk",))
+
+  def test_agrees(self):
+    self.assertAgrees(self.get_index())
+
+  def test_add_file(self):
+    self.touch("d/sub/new.c")
+    index = self.get_index()
+    self.assertTrue(index.isfile("d/sub/new.c"))
+    self.assertAgrees(index)
+
+  def test_remove_file(self):
+    os.remove("d/b.c")
+    index = self.get_index()
+    self.assertFalse(index.isfile("d/b.c"))
+    self.assertAgrees(index)
+
+  def test_rename_file(self):
+    os.rename("a.c", "renamed.c")
+    index = self.get_index()
+    self.assertFalse(index.isfile("a.c"))
+    self.assertTrue(index.isfile("renamed.c"))
+    self.assertAgrees(index)
+
+  def test_add_directory(self):
+    self.touch("d/sub/new/g.c")
+    index = self.get_index()
+    self.assertTrue(index.isdir("d/sub/new"))
+    self.assertTrue(index.isfile("d/sub/new/g.c"))
+    self.assertAgrees(index)
+
+  def test_remove_directory(self):
+    shutil.rmtree("d/sub")
+    index = self.get_index()
+    self.assertFalse(index.isdir("d/sub"))
+    self.assertFalse(index.isfile("d/sub/c.c"))
+    self.assertAgrees(index)
+
+  def test_rename_directory(self):
+    os.rename("d/sub", "d/other")
+    index = self.get_index()
+    self.assertFalse(index.isdir("d/sub"))
+    self.assertTrue(index.isfile("d/other/c.c"))
+    self.assertEqual(sorted(index.walkfiles("d", ".c")), [ "d/b.c", "d/other/c.c" ])
+    self.assertAgrees(index)
+
+class TestGitIndex(SourceIndexTestCase):
+  def setUp(self):
+    SourceIndexTestCase.setUp(self)
+    with open(os.devnull, "w") as devnull:
+      for command in [ [ "init", "-q" ], [ "add", "." ], [ "-c", "user.name=test", "-c", "user.email=test@example.com", "commit", "-q", "-m", "tree" ] ]:
+        subprocess.check_call([ "git" ] + command, stdout=devnull, stderr=devnull)
+    self.stamp = self.get_index().stamp
+    self.assertEqual(self.stamp[0], "git")
+
+  def test_agrees(self):
+    self.assertAgrees(self.get_index())
+
+  def test_untracked_file(self):
+    self.touch("d/sub/new/g.c")
+    index = self.get_index()
+    self.assertNotEqual(index.stamp, self.stamp)
+    self.assertTrue(index.isfile("d/sub/new/g.c"))
+    self.assertAgrees(index)
+
+  def test_deleted_file(self):
+    os.remove("d/b.c")
+    index = self.get_index()
+    self.assertNotEqual(index.stamp, self.stamp)
+    self.assertFalse(index.isfile("d/b.c"))
+    self.assertAgrees(index)
+
+if __name__ == '__main__':
+  unittest.main()